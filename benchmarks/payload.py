@@ -0,0 +1,91 @@
+"""Compare the size of chart payloads sent to the client, as full figures and in the compact transport.
+
+The candlestick chart is also measured as it is sent: a short tail of daily history for the first paint, and daily
+bars only for the newest days when zoomed out to the whole lookback window.
+
+Run from the repository root with ``python -m benchmarks.payload``.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+from code_jam_jazzy_jacarandas_2025.charts import (
+    create_candlestick_chart,
+    create_pie_chart,
+    create_rain_radar_chart,
+    create_wind_spiral_chart,
+)
+from code_jam_jazzy_jacarandas_2025.fetcher import Location, weather_fetcher
+from code_jam_jazzy_jacarandas_2025.ohlc import DailyOHLC
+from code_jam_jazzy_jacarandas_2025.rollups import rollup_hours
+from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings
+from code_jam_jazzy_jacarandas_2025.transport import compact_figure, payload_size
+
+from benchmarks.synthetic import synthetic_hourly_dataframe
+
+
+def main() -> None:
+    """Print payload sizes of every chart."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lookback-days", type=int, default=365)
+    parser.add_argument("--forecast-days", type=int, default=16)
+    parser.add_argument("--history-days", type=int, default=FetcherSettings.candlestick_history_days)
+    args = parser.parse_args()
+
+    location = Location("Benchmark", "BM", 51.5085, -0.1257)
+    full_hourly = synthetic_hourly_dataframe(args.lookback_days + args.forecast_days)
+    forecast_hourly = full_hourly.iloc[-args.forecast_days * 24 :].reset_index(drop=True)
+    forecast_ohlc = weather_fetcher.create_ohlc_dataframe(forecast_hourly)
+
+    figures = {
+        "ohlc (archive + forecast)": create_candlestick_chart(
+            weather_fetcher.create_ohlc_dataframe(full_hourly), location
+        ),
+        "pie": create_pie_chart(forecast_ohlc, location),
+        "rain radar": create_rain_radar_chart(forecast_hourly.copy(), location),
+        "wind spiral": create_wind_spiral_chart(forecast_hourly.copy(), location),
+    }
+
+    print(f"{'chart':<28}{'figure':>10}{'first load':>12}{'update':>10}{'reduction':>11}")
+    for name, figure in figures.items():
+        figure_size = len(pio.to_json(figure))
+        payload = compact_figure(figure)
+        first_load = payload_size(payload)
+        update = payload_size({"data": payload["data"], "layout": {}})
+        print(f"{name:<28}{figure_size:>10}{first_load:>12}{update:>10}{figure_size / update:>10.1f}x")
+
+    # The candlestick chart used to send every day of the lookback window as a daily bar, sizes are compared to that.
+    full_daily = payload_size(compact_figure(figures["ohlc (archive + forecast)"]))
+    archive_hourly = full_hourly.iloc[: -args.forecast_days * 24]
+    sent = {
+        f"first paint ({args.history_days} days)": args.history_days,
+        f"whole lookback ({args.lookback_days} days)": args.lookback_days,
+    }
+
+    print(f"\n{'candlestick as sent':<36}{'first load':>12}{'update':>10}{'vs daily':>11}")
+    for name, history_days in sent.items():
+        key = weather_fetcher.build_candlestick_chart(
+            location, _candlestick_ohlc(forecast_hourly, archive_hourly, history_days)
+        )
+        payload = weather_fetcher.chart_payload(key)
+        if payload is None:
+            continue
+        first_load = payload_size(payload)
+        update = payload_size({"data": payload["data"], "layout": {}})
+        print(f"{name:<36}{first_load:>12}{update:>10}{full_daily / first_load:>10.1f}x")
+
+
+def _candlestick_ohlc(forecast_hourly: pd.DataFrame, archive_hourly: pd.DataFrame, history_days: int) -> DailyOHLC:
+    """Get the daily values of the forecast with the newest days of archive rollups, as the app reads them."""
+    history = archive_hourly.iloc[-history_days * 24 :]
+    columns = [column for column in history.columns if column != "date"]
+    times = history["date"].dt.as_unit("s").astype("int64").to_numpy()
+    ohlc = DailyOHLC(forecast_hourly)
+    ohlc.prepend_rollups(rollup_hours(times, history[columns].to_numpy(np.float32).T, columns))
+    return ohlc
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Time every stage of the fetch, decode, aggregate and figure pipeline on synthetic or recorded responses.
+
+Run from the repository root with ``python -m benchmarks.pipeline``. Every stage is measured for every combination
+of lookback days, forecast days and location count, and reports its wall time, peak traced memory and the number of
+memory blocks it left allocated. Use ``--output`` to write the results as JSON, and ``--compare`` to print the change
+against the results of another commit.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from itertools import product
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+from code_jam_jazzy_jacarandas_2025.charts import (
+    create_candlestick_chart,
+    create_pie_chart,
+    create_rain_radar_chart,
+    create_wind_spiral_chart,
+    hourly_precipitation_profiles,
+)
+from code_jam_jazzy_jacarandas_2025.fetcher import ARCHIVE_COLUMNS, FORECAST_COLUMNS, Location, weather_fetcher
+from code_jam_jazzy_jacarandas_2025.ohlc import DailyOHLC
+from code_jam_jazzy_jacarandas_2025.transport import compact_figure
+from plotly.graph_objects import Figure
+
+from benchmarks.synthetic import parse_response_body, synthetic_response_body
+
+type ChartBuilder = Callable[[pd.DataFrame, Location], Figure]
+
+
+def measure(fn: Callable[[], object], repeats: int) -> dict[str, float | int]:
+    """Measure a stage, the first call is a warm up and the memory is traced in a separate call."""
+    fn()
+    wall = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        wall.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        "wall_median_s": statistics.median(wall),
+        "wall_min_s": min(wall),
+        "peak_bytes": peak,
+        "allocated_blocks": sum(stat.count_diff for stat in after.compare_to(before, "filename")),
+    }
+
+
+def stages(lookback_days: int, forecast_days: int, locations: int) -> Iterator[tuple[str, Callable[[], object]]]:
+    """Get the stages of a pipeline run, every stage works on all locations."""
+    places = [Location(f"Location {i}", f"L{i}", 50.0 + i, float(i)) for i in range(locations)]
+    forecast_body = synthetic_response_body(forecast_days, locations, seed=1)
+    archive_body = synthetic_response_body(lookback_days, locations, seed=2)
+
+    def decode(body: bytes, columns: dict[str, tuple[str, ...]]) -> list[pd.DataFrame | None]:
+        return [weather_fetcher._process_hourly_data(response, columns) for response in parse_response_body(body)]  # noqa: SLF001
+
+    forecasts = decode(forecast_body, FORECAST_COLUMNS)
+    archives = decode(archive_body, ARCHIVE_COLUMNS)
+    yield "decode forecast", lambda: decode(forecast_body, FORECAST_COLUMNS)
+    yield "decode archive", lambda: decode(archive_body, ARCHIVE_COLUMNS)
+
+    def daily_values() -> list[DailyOHLC]:
+        daily = [DailyOHLC(forecast) for forecast in forecasts]
+        for ohlc, archive in zip(daily, archives, strict=True):
+            ohlc.prepend(archive)
+        return daily
+
+    daily = daily_values()
+    forecast_ohlc = [DailyOHLC(forecast).frame for forecast in forecasts]
+    full_ohlc = [ohlc.frame for ohlc in daily]
+    yield "ohlc", daily_values
+
+    chart_inputs = {
+        create_candlestick_chart: full_ohlc,
+        create_pie_chart: forecast_ohlc,
+        create_rain_radar_chart: forecasts,
+        create_wind_spiral_chart: forecasts,
+    }
+    for builder, inputs in chart_inputs.items():
+
+        def build(builder: ChartBuilder = builder, inputs: list[pd.DataFrame] = inputs) -> list[Figure]:
+            return [builder(dataframe, place) for dataframe, place in zip(inputs, places, strict=True)]
+
+        figures = build()
+        yield builder.__name__, build
+        yield f"compact_figure {builder.__name__}", lambda figures=figures: [compact_figure(f) for f in figures]
+        yield f"to_json {builder.__name__}", lambda figures=figures: [pio.to_json(f) for f in figures]
+
+    yield "hourly_precipitation_profiles", lambda: hourly_precipitation_profiles(forecasts)
+
+
+def recorded_stages(recordings: Path) -> Iterator[tuple[str, Callable[[], object]]]:
+    """Get a decode stage for every recorded response body."""
+    for path in sorted(recordings.glob("*.bin")):
+        body = path.read_bytes()
+        yield (
+            f"decode recording {path.stem[:12]}",
+            lambda body=body: [weather_fetcher._process_hourly_data(r) for r in parse_response_body(body)],  # noqa: SLF001
+        )
+
+
+def environment() -> dict[str, str]:
+    """Describe what the results were measured on."""
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+        capture_output=True,
+        text=True,
+        check=False,
+    ).stdout.strip()
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def _key(result: dict[str, Any]) -> tuple[Any, ...]:
+    return result["stage"], result["lookback_days"], result["forecast_days"], result["locations"]
+
+
+def compare(results: list[dict[str, Any]], baseline: dict[str, Any]) -> None:
+    """Print the change of wall time and peak memory of every stage against a baseline run."""
+    previous = {_key(result): result for result in baseline["results"]}
+    print(f"\nCompared to {baseline['environment'].get('commit') or 'baseline'}")
+    print(f"{'stage':<46}{'days':>10}{'locs':>6}{'wall':>10}{'peak':>10}")
+    for result in results:
+        if (before := previous.get(_key(result))) is None:
+            continue
+        wall = result["wall_median_s"] / before["wall_median_s"]
+        peak = result["peak_bytes"] / max(before["peak_bytes"], 1)
+        days = f"{result['lookback_days']}+{result['forecast_days']}"
+        print(f"{result['stage']:<46}{days:>10}{result['locations']:>6}{wall:>9.2f}x{peak:>9.2f}x")
+
+
+def main() -> None:
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookback-days", type=int, nargs="+", default=[92, 365])
+    parser.add_argument("--forecast-days", type=int, nargs="+", default=[16])
+    parser.add_argument("--locations", type=int, nargs="+", default=[1, 20])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--recordings", type=Path, help="also decode the responses recorded in this directory")
+    parser.add_argument("--output", type=Path, help="write the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="compare with the results in this JSON file")
+    args = parser.parse_args()
+
+    runs = [
+        ({"lookback_days": lookback, "forecast_days": forecast, "locations": count}, stages(lookback, forecast, count))
+        for lookback, forecast, count in product(args.lookback_days, args.forecast_days, args.locations)
+    ]
+    if args.recordings:
+        runs.append(({"lookback_days": 0, "forecast_days": 0, "locations": 0}, recorded_stages(args.recordings)))
+
+    results = []
+    print(f"{'stage':<46}{'days':>10}{'locs':>6}{'median ms':>11}{'peak KiB':>10}{'blocks':>8}")
+    for case, run in runs:
+        for stage, fn in run:
+            result = {"stage": stage, **case, "repeats": args.repeats, **measure(fn, args.repeats)}
+            results.append(result)
+            days = f"{case['lookback_days']}+{case['forecast_days']}"
+            print(
+                f"{stage:<46}{days:>10}{case['locations']:>6}{result['wall_median_s'] * 1000:>11.2f}"
+                f"{result['peak_bytes'] / 1024:>10.0f}{result['allocated_blocks']:>8}"
+            )
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Synthetic weather data shaped like the Open-Meteo responses, for benchmarks without the network."""
+
+import flatbuffers
+import numpy as np
+import pandas as pd
+from openmeteo_sdk.Variable import Variable
+from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+# Hourly variables of FetcherSettings.hourly, with their altitude.
+HOURLY_VARIABLES = (
+    (Variable.temperature, 2),
+    (Variable.precipitation, 0),
+    (Variable.rain, 0),
+    (Variable.showers, 0),
+    (Variable.wind_speed, 10),
+    (Variable.wind_direction, 10),
+    (Variable.wind_gusts, 10),
+)
+
+# Field slots of the FlatBuffers tables, see the offsets in the generated openmeteo_sdk classes.
+_VARIABLE_SLOTS = 15
+_VARIABLE, _VALUES, _ALTITUDE = 0, 3, 5
+_TIME_SLOTS = 4
+_TIME, _TIME_END, _INTERVAL, _VARIABLES = 0, 1, 2, 3
+_RESPONSE_SLOTS = 16
+_LATITUDE, _LONGITUDE, _HOURLY = 0, 1, 11
+
+
+def _start(days: int) -> pd.Timestamp:
+    return pd.Timestamp.now(tz="UTC").normalize() - pd.Timedelta(days=days)
+
+
+def synthetic_hourly_dataframe(days: int, seed: int = 0) -> pd.DataFrame:
+    """Create hourly weather data shaped like the decoded Open-Meteo responses."""
+    rng = np.random.default_rng(seed)
+    hours = days * 24
+    return pd.DataFrame(
+        {
+            "date": pd.date_range(_start(days), periods=hours, freq="h"),
+            "temperature_2m": (15 + 10 * rng.standard_normal(hours)).astype(np.float32),
+            "precipitation": rng.exponential(0.3, hours).astype(np.float32),
+            "wind_speed_10m": rng.uniform(0, 40, hours).astype(np.float32),
+            "wind_direction_10m": rng.uniform(0, 360, hours).astype(np.float32),
+            "wind_gusts_10m": rng.uniform(0, 60, hours).astype(np.float32),
+        }
+    )
+
+
+def synthetic_response_body(days: int, locations: int = 1, seed: int = 0) -> bytes:
+    """Create the body of a FlatBuffers API response with hourly data for the given number of locations."""
+    rng = np.random.default_rng(seed)
+    start = int(_start(days).timestamp())
+    hours = days * 24
+    body = b""
+    for location in range(locations):
+        builder = flatbuffers.Builder(hours * 4 * len(HOURLY_VARIABLES) + 1024)
+        variables = []
+        for variable, altitude in HOURLY_VARIABLES:
+            values = builder.CreateNumpyVector((20 * rng.random(hours)).astype(np.float32))
+            builder.StartObject(_VARIABLE_SLOTS)
+            builder.PrependUint8Slot(_VARIABLE, variable, 0)
+            builder.PrependUOffsetTRelativeSlot(_VALUES, values, 0)
+            builder.PrependInt16Slot(_ALTITUDE, altitude, 0)
+            variables.append(builder.EndObject())
+
+        builder.StartVector(4, len(variables), 4)
+        for variable in reversed(variables):
+            builder.PrependUOffsetTRelative(variable)
+        variables_vector = builder.EndVector()
+
+        builder.StartObject(_TIME_SLOTS)
+        builder.PrependInt64Slot(_TIME, start, 0)
+        builder.PrependInt64Slot(_TIME_END, start + hours * 3600, 0)
+        builder.PrependInt32Slot(_INTERVAL, 3600, 0)
+        builder.PrependUOffsetTRelativeSlot(_VARIABLES, variables_vector, 0)
+        hourly = builder.EndObject()
+
+        builder.StartObject(_RESPONSE_SLOTS)
+        builder.PrependFloat32Slot(_LATITUDE, 50.0 + location, 0)
+        builder.PrependFloat32Slot(_LONGITUDE, float(location), 0)
+        builder.PrependUOffsetTRelativeSlot(_HOURLY, hourly, 0)
+        builder.FinishSizePrefixed(builder.EndObject())
+        body += bytes(builder.Output())
+    return body
+
+
+def parse_response_body(body: bytes) -> list[WeatherApiResponse]:
+    """Split a response body into its size prefixed messages, like ``openmeteo_requests.Client`` does."""
+    responses = []
+    position = 0
+    while position < len(body):
+        length = int.from_bytes(body[position : position + 4], byteorder="little")
+        responses.append(WeatherApiResponse.GetRootAs(body, position + 4))
+        position += length + 4
+    return responses
@@ -0,0 +1,324 @@
+"""Local memory-mapped store for archived hourly weather data.
+
+Every location has one file: a small JSON header padded to a fixed size, followed by a float32 array with a row per
+hour and a column per variable. Hours are fixed-width slots counted from the time in the header, so no timestamps are
+stored and hours that were never fetched are NaN. Files are mapped read-only, every backend worker shares the same
+pages through the page cache instead of decoding its own copy.
+
+Next to it, every location has a file of daily rollups in the same layout, with a row per day. Writing hours
+recomputes the rollups of the days they fall in, so long ranges can be charted from a row per day.
+
+The forecasts fetched by the prefetch scheduler are kept in the same layout too, a file per location holding the
+newest one, so the other workers can fill their caches without fetching them again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from code_jam_jazzy_jacarandas_2025.rollups import HOURS, ROLLUP_COLUMNS, SECONDS_PER_DAY, DailyRollups, rollup_hours
+from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096
+SUFFIX = ".hourly"
+ROLLUP_SUFFIX = ".daily"
+FORECAST_SUFFIX = ".forecast"
+INTERVAL = 3600
+
+
+class HourlyBlock(NamedTuple):
+    """Hourly data of one location, with a row of data per column and the held range as its version."""
+
+    times: ndarray
+    data: ndarray
+    columns: tuple[str, ...]
+    version: tuple[date, date] | None
+
+
+class ArchiveStore:
+    """Store hourly archive data on disk and track which days are held per location."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _location_file(self, latitude: float, longitude: float) -> Path:
+        return self.root / f"{latitude:.4f}_{longitude:.4f}{SUFFIX}"
+
+    def _rollup_file(self, latitude: float, longitude: float) -> Path:
+        return self.root / f"{latitude:.4f}_{longitude:.4f}{ROLLUP_SUFFIX}"
+
+    def _forecast_file(self, latitude: float, longitude: float) -> Path:
+        return self.root / f"{latitude:.4f}_{longitude:.4f}{FORECAST_SUFFIX}"
+
+    def held_range(self, latitude: float, longitude: float) -> tuple[date, date] | None:
+        """Get the first and last day held for a location, if any."""
+        header = _read_header(self._location_file(latitude, longitude))
+        return None if header is None else _held_range(header)
+
+    def missing_ranges(self, latitude: float, longitude: float, start: date, end: date) -> list[tuple[date, date]]:
+        """Get the date ranges between start and end (inclusive) that still need to be fetched."""
+        held = self.held_range(latitude, longitude)
+        if held is None or held[1] < start or held[0] > end:
+            return [(start, end)]
+
+        held_start, held_end = held
+        missing: list[tuple[date, date]] = []
+        if start < held_start:
+            missing.append((start, held_start - timedelta(days=1)))
+        if held_end < end:
+            missing.append((held_end + timedelta(days=1), end))
+        return missing
+
+    def read_block(self, latitude: float, longitude: float) -> HourlyBlock | None:
+        """Map all hours held for a location read-only, the block version is the held range."""
+        mapped = _map_file(self._location_file(latitude, longitude), "hours")
+        if mapped is None:
+            return None
+
+        header, values = mapped
+        times = header["time"] + np.arange(header["hours"], dtype=np.int64) * header["interval"]
+        return HourlyBlock(times, values.T, tuple(header["columns"]), _held_range(header))
+
+    def file_sizes(self, latitude: float, longitude: float) -> tuple[int, int]:
+        """Get the bytes of the hourly and the rollup file of a location, which the workers map into memory."""
+        return _file_size(self._location_file(latitude, longitude)), _file_size(self._rollup_file(latitude, longitude))
+
+    def read_rollups(self, latitude: float, longitude: float, start: date, end: date) -> DailyRollups | None:
+        """Read the daily rollups between start and end (inclusive), days without any hours are left out.
+
+        Rollups are built from the hourly file first when it was written before rollups existed.
+        """
+        path = self._rollup_file(latitude, longitude)
+        mapped = _map_rollups(path)
+        if mapped is None:
+            with self._lock:
+                block = self.read_block(latitude, longitude)
+                if block is None:
+                    return None
+                self._update_rollups(path, block, block.times)
+            mapped = _map_rollups(path)
+            if mapped is None:
+                return None
+
+        header, rows = mapped
+        first = min(max(_epoch_day(start) - header["day"], 0), header["days"])
+        last = min(max(_epoch_day(end) + 1 - header["day"], first), header["days"])
+        held = rows[first:last, HOURS] > 0
+        # Indexing with the mask copies the rows, so the file isn't kept mapped.
+        return DailyRollups(header["day"] + np.arange(first, last)[held], rows[first:last][held])
+
+    def write(self, latitude: float, longitude: float, dataframe: pd.DataFrame) -> None:
+        """Merge hourly data into the file of a location and extend its held range.
+
+        Rows without a temperature are not stored, the archive has not caught up with those hours yet.
+        The rollups of the days the new hours fall in are recomputed afterwards.
+        The file is rewritten next to the old one and swapped in, workers that mapped the old file keep reading it.
+        """
+        dataframe = dataframe.dropna(subset=["temperature_2m"])
+        if dataframe.empty:
+            return
+
+        times = dataframe["date"].dt.as_unit("s").astype("int64").to_numpy()
+        path = self._location_file(latitude, longitude)
+        with self._lock:
+            existing = self.read_block(latitude, longitude)
+            columns = list(existing.columns) if existing is not None else []
+            columns += [column for column in dataframe.columns if column not in {"date", *columns}]
+
+            first = int(times.min())
+            last = int(times.max())
+            if existing is not None and len(existing.times):
+                first = min(first, int(existing.times[0]))
+                last = max(last, int(existing.times[-1]))
+            values = np.full(((last - first) // INTERVAL + 1, len(columns)), np.nan, dtype=np.float32)
+
+            if existing is not None:
+                offset = (int(existing.times[0]) - first) // INTERVAL if len(existing.times) else 0
+                values[offset : offset + len(existing.times), : len(existing.columns)] = existing.data.T
+            rows = (times - first) // INTERVAL
+            for i, column in enumerate(columns):
+                if column in dataframe.columns:
+                    values[rows, i] = dataframe[column].to_numpy()
+
+            held = self._extend_held_range(existing, dataframe)
+            # Everything is copied out of the mapped file, its mapping has to be closed before the file is replaced.
+            # Windows refuses to replace a file while a view of it is mapped.
+            del existing
+            header = {
+                "format": FORMAT_VERSION,
+                "time": first,
+                "interval": INTERVAL,
+                "hours": len(values),
+                "columns": columns,
+                "start": held[0].isoformat() if held else None,
+                "end": held[1].isoformat() if held else None,
+            }
+            self.root.mkdir(parents=True, exist_ok=True)
+            _atomic_write(path, _encode_header(header) + values.tobytes())
+
+            hours = HourlyBlock(
+                first + np.arange(len(values), dtype=np.int64) * INTERVAL, values.T, tuple(columns), held
+            )
+            self._update_rollups(self._rollup_file(latitude, longitude), hours, times)
+
+    def _update_rollups(self, path: Path, block: HourlyBlock, times: ndarray) -> None:
+        """Recompute the rollups of the days the given times fall in from all hours of the block."""
+        if not len(times) or not len(block.times):
+            return
+
+        # Hours are fixed-width slots from the first time of the block, so the hours of a day are found by offset.
+        first = int(block.times[0])
+        days = np.unique(times // SECONDS_PER_DAY)
+        slots = ((days * SECONDS_PER_DAY - first) // INTERVAL)[:, None] + np.arange(SECONDS_PER_DAY // INTERVAL)
+        slots = slots[(slots >= 0) & (slots < len(block.times))]
+        rollups = rollup_hours(block.times[slots], block.data[:, slots], block.columns)
+
+        mapped = _map_rollups(path)
+        first_day = int(rollups.days[0])
+        last_day = int(rollups.days[-1])
+        if mapped is not None:
+            header, existing = mapped
+            first_day = min(first_day, header["day"])
+            last_day = max(last_day, header["day"] + header["days"] - 1)
+        rows = np.full((last_day - first_day + 1, len(ROLLUP_COLUMNS)), np.nan, dtype=np.float32)
+
+        if mapped is not None:
+            offset = header["day"] - first_day
+            rows[offset : offset + header["days"]] = existing
+            # The old file is unmapped before it is replaced, as in ``write``.
+            del mapped, existing
+        rows[rollups.days - first_day] = rollups.data
+
+        header = {"format": FORMAT_VERSION, "day": first_day, "days": len(rows), "columns": list(ROLLUP_COLUMNS)}
+        self.root.mkdir(parents=True, exist_ok=True)
+        _atomic_write(path, _encode_header(header) + rows.tobytes())
+
+    def read_forecast(self, latitude: float, longitude: float) -> tuple[float, pd.DataFrame] | None:
+        """Read the newest forecast written for a location, with the time it was written."""
+        mapped = _map_file(self._forecast_file(latitude, longitude), "hours")
+        if mapped is None:
+            return None
+
+        header, values = mapped
+        times = header["time"] + np.arange(header["hours"], dtype=np.int64) * header["interval"]
+        dataframe = pd.DataFrame({"date": pd.to_datetime(times, unit="s", utc=True)})
+        for i, column in enumerate(header["columns"]):
+            dataframe[column] = np.array(values[:, i])
+        return header["written"], dataframe
+
+    def write_forecast(self, latitude: float, longitude: float, dataframe: pd.DataFrame) -> None:
+        """Replace the forecast of a location, the forecast has to be hourly."""
+        if dataframe.empty:
+            return
+
+        columns = [column for column in dataframe.columns if column != "date"]
+        times = dataframe["date"].dt.as_unit("s").astype("int64").to_numpy()
+        values = dataframe[columns].to_numpy(dtype=np.float32)
+        header = {
+            "format": FORMAT_VERSION,
+            "time": int(times[0]),
+            "interval": INTERVAL,
+            "hours": len(values),
+            "columns": columns,
+            "written": time.time(),
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        _atomic_write(self._forecast_file(latitude, longitude), _encode_header(header) + values.tobytes())
+
+    @staticmethod
+    def _extend_held_range(existing: HourlyBlock | None, dataframe: pd.DataFrame) -> tuple[date, date] | None:
+        held = existing.version if existing is not None else None
+        # The newest day may still be incomplete, so it is only counted as held once a later day exists.
+        first = dataframe["date"].min().date()
+        last = dataframe["date"].max().date() - timedelta(days=1)
+        if last < first:
+            return held
+        if held is not None:
+            first = min(first, held[0])
+            last = max(last, held[1])
+        return first, last
+
+
+def _held_range(header: dict[str, Any]) -> tuple[date, date] | None:
+    if header["start"] is None:
+        return None
+    return date.fromisoformat(header["start"]), date.fromisoformat(header["end"])
+
+
+def _encode_header(header: dict[str, Any]) -> bytes:
+    encoded = json.dumps(header).encode()
+    if len(encoded) >= HEADER_SIZE:
+        msg = f"Archive header of {len(encoded)} bytes doesn't fit in {HEADER_SIZE} bytes"
+        raise ValueError(msg)
+    return encoded.ljust(HEADER_SIZE, b" ")
+
+
+def _read_header(path: Path) -> dict[str, Any] | None:
+    try:
+        with path.open("rb") as file:
+            return _parse_header(file)
+    except FileNotFoundError:
+        return None
+
+
+def _parse_header(file: BinaryIO) -> dict[str, Any] | None:
+    header = json.loads(file.read(HEADER_SIZE))
+    return header if header.get("format") == FORMAT_VERSION else None
+
+
+def _map_file(path: Path, length: str) -> tuple[dict[str, Any], ndarray] | None:
+    """Read the header of a file and map its rows read-only, the header holds the number of rows under length.
+
+    Both come from the same open file, so a file swapped in by another worker in between can't mix them up.
+    """
+    try:
+        with path.open("rb") as file:
+            header = _parse_header(file)
+            if header is None:
+                return None
+            rows = np.memmap(
+                file, dtype=np.float32, mode="r", offset=HEADER_SIZE, shape=(header[length], len(header["columns"]))
+            )
+    except FileNotFoundError:
+        return None
+    return header, rows
+
+
+def _map_rollups(path: Path) -> tuple[dict[str, Any], ndarray] | None:
+    mapped = _map_file(path, "days")
+    return mapped if mapped is not None and tuple(mapped[0]["columns"]) == ROLLUP_COLUMNS else None
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _epoch_day(day: date) -> int:
+    return (day - date(1970, 1, 1)).days
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """Write through a temporary file, so other workers never read a partially written file."""
+    tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+archive_store = ArchiveStore(Path(FetcherSettings.archive_store_path))
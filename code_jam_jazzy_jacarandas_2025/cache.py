@@ -0,0 +1,203 @@
+"""Shared in-process caches for data that is expensive to build and identical across sessions."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings
+from code_jam_jazzy_jacarandas_2025.transport import payload_size
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable
+
+    from code_jam_jazzy_jacarandas_2025.transport import ChartPayload, TracePatch
+
+
+class SingleFlight[V]:
+    """Coalesce concurrent calls for the same key into a single call, sharing its result.
+
+    Counts how many callers every flight served, see ``stats``.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: dict[Hashable, tuple[Future[V], list[int]]] = {}
+        self._stats = {"flights": 0, "callers": 0, "max_callers": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], V]) -> V:
+        """Call fn, unless a call for the same key is already running, then wait for that one instead."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = (Future(), [1])
+            else:
+                flight[1][0] += 1
+        future, callers = flight
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                self._stats["flights"] += 1
+                self._stats["callers"] += callers[0]
+                self._stats["max_callers"] = max(self._stats["max_callers"], callers[0])
+        return future.result()
+
+    def stats(self) -> dict[str, int]:
+        """Get the number of finished flights, the callers they served and the most callers of a single flight."""
+        with self._lock:
+            return dict(self._stats)
+
+
+class Revalidator:
+    """Run refreshes in background threads, at most one per key at a time."""
+
+    def __init__(self, max_workers: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="revalidate")
+        self._lock = threading.Lock()
+        self._running: dict[Hashable, Future] = {}
+
+    def submit[V](self, key: Hashable, fn: Callable[[], V]) -> Future[V]:
+        """Start fn in the background, unless a refresh for the same key is already running, then return that one."""
+        with self._lock:
+            running = self._running.get(key)
+            if running is None:
+                running = self._running[key] = self._executor.submit(fn)
+                running.add_done_callback(lambda done: self._forget(key, done))
+            return running
+
+    def _forget(self, key: Hashable, done: Future) -> None:
+        with self._lock:
+            if self._running.get(key) is done:
+                del self._running[key]
+
+
+class LRUCache[V]:
+    """Thread-safe least recently used cache with a time to live and a total size cap.
+
+    Values are stale after stale_after seconds, they are still served but should be revalidated.
+    After ttl seconds they expire and are dropped.
+    """
+
+    def __init__(
+        self, max_bytes: int, ttl: float, size_of: Callable[[V], int], stale_after: float | None = None
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_after = ttl if stale_after is None else stale_after
+        self._size_of = size_of
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[V, float, float, int]] = OrderedDict()
+        self._bytes = 0
+        self._flight: SingleFlight[V | None] = SingleFlight()
+
+    def get(self, key: Hashable) -> V | None:
+        """Get a cached value, or None when it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, _, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        """Store a value, evicting the least recently used entries until it fits."""
+        size = self._size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            now = time.monotonic()
+            self._entries[key] = (value, now + self.stale_after, now + self.ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._evict(next(iter(self._entries)))
+
+    def get_or_build(self, key: Hashable, build: Callable[[], V | None]) -> V | None:
+        """Get a cached value, building it once when missing, even if several threads ask at the same time.
+
+        A build that returns None is not cached.
+        """
+        if (value := self.get(key)) is not None:
+            return value
+
+        def build_if_missing() -> V | None:
+            if (value := self.get(key)) is not None:
+                return value
+            return self._build_and_store(key, build)
+
+        return self._flight.do(key, build_if_missing)
+
+    def refresh(self, key: Hashable, build: Callable[[], V | None]) -> V | None:
+        """Build a value and replace the cached one, which stays available to readers until then."""
+        return self._flight.do(key, lambda: self._build_and_store(key, build))
+
+    def revalidate(self, key: Hashable, build: Callable[[], V | None]) -> Future[V | None] | None:
+        """Refresh a stale value in the background, the stale value stays available to readers until then.
+
+        Get the running refresh, or None when the value is missing or still fresh.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] >= time.monotonic():
+                return None
+        return revalidator.submit(("cache", id(self), key), lambda: self.refresh(key, build))
+
+    def _build_and_store(self, key: Hashable, build: Callable[[], V | None]) -> V | None:
+        value = build()
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def _evict(self, key: Hashable) -> None:
+        _, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+def data_version(dataframe: pd.DataFrame) -> int:
+    """Get a fingerprint of the contents of a dataframe, which changes whenever new data arrives."""
+    return int(pd.util.hash_pandas_object(dataframe, index=False).sum())
+
+
+def _dataframe_size(dataframe: pd.DataFrame) -> int:
+    return int(dataframe.memory_usage(deep=True).sum())
+
+
+api_flight: SingleFlight[list[pd.DataFrame | None]] = SingleFlight()
+# Fetches of missing archive days together with writing them to the archive store.
+archive_flight: SingleFlight[None] = SingleFlight()
+revalidator = Revalidator(max_workers=FetcherSettings.prefetch_concurrency)
+forecast_cache: LRUCache[pd.DataFrame] = LRUCache(
+    max_bytes=FetcherSettings.forecast_cache_max_mb * 1024 * 1024,
+    ttl=FetcherSettings.forecast_hard_ttl,
+    size_of=_dataframe_size,
+    stale_after=FetcherSettings.forecast_soft_ttl,
+)
+figure_cache: LRUCache[ChartPayload] = LRUCache(
+    max_bytes=FetcherSettings.figure_cache_max_mb * 1024 * 1024,
+    ttl=FetcherSettings.figure_cache_ttl,
+    size_of=payload_size,
+)
+# Patches between two charts of the figure cache, keyed by both of their keys.
+patch_cache: LRUCache[TracePatch] = LRUCache(
+    max_bytes=FetcherSettings.figure_cache_max_mb * 1024 * 1024,
+    ttl=FetcherSettings.figure_cache_ttl,
+    size_of=payload_size,
+)
@@ -1,14 +1,32 @@
-import random
+from __future__ import annotations
+
+import itertools
+from typing import TYPE_CHECKING
 
 import numpy as np
-from pandas import DataFrame
+import pandas as pd
 from plotly.graph_objects import Candlestick, Figure, Pie, Scatter, Scatterpolar
 
+from code_jam_jazzy_jacarandas_2025.rollups import SECONDS_PER_DAY
 from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings, Settings
 
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from pandas import DataFrame
+
+    from code_jam_jazzy_jacarandas_2025.fetcher import Location
+    from code_jam_jazzy_jacarandas_2025.rollups import Period
 
-def create_candlestick_chart(df_ohlc: DataFrame) -> Figure:
-    """Create candlestick chart from OHLC data."""
+
+def create_candlestick_chart(
+    df_ohlc: DataFrame, location: Location, coarse: Sequence[tuple[Period, DataFrame]] = ()
+) -> Figure:
+    """Create candlestick chart from OHLC data.
+
+    Older history can be added as coarse weekly or monthly bars, every period gets its own trace after the daily one,
+    so plotly sizes its candles by the period.
+    """
     fig = Figure(
         data=[
             Candlestick(
@@ -18,12 +36,25 @@ def create_candlestick_chart(df_ohlc: DataFrame) -> Figure:
                 low=df_ohlc["Low"],
                 close=df_ohlc["Close"],
             ),
+            *(
+                Candlestick(
+                    x=bars["date"],
+                    open=bars["Open"],
+                    high=bars["High"],
+                    low=bars["Low"],
+                    close=bars["Close"],
+                    name=f"{period.capitalize()}ly",
+                )
+                for period, bars in coarse
+            ),
         ],
     )
+    if coarse:
+        fig.update_layout(showlegend=False)
 
     fig.update_layout(
         title={
-            "text": f"Daily Temperature OHLC (°C) in {FetcherSettings.country_name}",
+            "text": f"Daily Temperature OHLC (°C) in {location.name}",
             "x": 0.5,
         },
         xaxis_rangeslider_visible=True,
@@ -45,12 +76,14 @@ def create_candlestick_chart(df_ohlc: DataFrame) -> Figure:
             "family": Settings.font_family,
             "size": 14,
         },
+        # The zoom of the user is kept when older history is added to the chart, until the location changes.
+        uirevision=f"{location.latitude}:{location.longitude}",
     )
 
     return fig
 
 
-def create_pie_chart(df_ohlc: DataFrame) -> Figure:
+def create_pie_chart(df_ohlc: DataFrame, location: Location) -> Figure:
     """Create pie chart showing daily highest temperatures."""
     labels = df_ohlc["date"].dt.strftime("%b %d")
     values = df_ohlc["High"]
@@ -67,7 +100,7 @@ def create_pie_chart(df_ohlc: DataFrame) -> Figure:
 
     fig_pie_all.update_layout(
         title={
-            "text": f"Daily Highest Temperatures in {FetcherSettings.country_name}",
+            "text": f"Daily Highest Temperatures in {location.name}",
             "x": 0.5,
             "xanchor": "center",
             "font": {
@@ -84,22 +117,37 @@ def create_pie_chart(df_ohlc: DataFrame) -> Figure:
     return fig_pie_all
 
 
-def create_rain_radar_chart(hourly_dataframe: DataFrame) -> Figure:
-    """Create a creative radar chart for precipitation data."""
-    # Use real precipitation data from API
-    hourly_dataframe["hour"] = hourly_dataframe["date"].dt.hour
-    rain_by_hour = hourly_dataframe.groupby("hour")["precipitation"].mean().reset_index()
+def hourly_precipitation_profiles(hourly_dataframes: Sequence[DataFrame]) -> np.ndarray:
+    """Get the mean precipitation per hour of the day of every dataframe, as a (dataframes x 24) matrix.
 
-    # Create 24-hour labels
-    hours = list(range(24))
-    rain_values: list[float] = []
+    All dataframes are reduced in one pass, by binning on location and hour. Hours without data are 0.
+    """
+    hours = [hourly_dataframe["date"].dt.hour.to_numpy() for hourly_dataframe in hourly_dataframes]
+    lengths = [len(hour) for hour in hours]
+    bins = np.repeat(np.arange(len(hours)) * 24, lengths) + np.concatenate(hours)
+    precipitation = np.concatenate(
+        [hourly_dataframe["precipitation"].to_numpy() for hourly_dataframe in hourly_dataframes]
+    )
 
-    for hour in hours:
-        value = rain_by_hour[rain_by_hour["hour"] == hour]["precipitation"]
-        rain_values.append(float(value.iloc[0]) if len(value) > 0 else 0.0)
+    # Missing values are left out of the mean, like pandas does.
+    valid = ~np.isnan(precipitation)
+    size = len(hours) * 24
+    sums = np.bincount(bins[valid], weights=precipitation[valid], minlength=size)
+    counts = np.bincount(bins[valid], minlength=size)
+    means = np.divide(sums, counts, out=np.zeros(size), where=counts > 0)
+    return means.reshape(len(hours), 24)
 
+
+def create_rain_radar_chart(hourly_dataframe: DataFrame, location: Location) -> Figure:
+    """Create a creative radar chart for precipitation data."""
+    return create_rain_radar_chart_from_profile(hourly_precipitation_profiles([hourly_dataframe])[0], location)
+
+
+def create_rain_radar_chart_from_profile(rain_by_hour: np.ndarray, location: Location) -> Figure:
+    """Create the precipitation radar chart from the mean precipitation of each hour of the day."""
     # Add first value at the end to close the radar chart
-    rain_values.append(rain_values[0])
+    rain_values = [*rain_by_hour.tolist(), float(rain_by_hour[0])]
+    hours = list(range(24))
     hour_labels = [f"{h:02d}:00" for h in hours] + [f"{hours[0]:02d}:00"]
 
     fig_rain = Figure()
@@ -118,7 +166,7 @@ def create_rain_radar_chart(hourly_dataframe: DataFrame) -> Figure:
         )
     )
 
-    max_rain = max(rain_values) if rain_values else 1
+    max_rain = max(rain_values)
     fig_rain.update_layout(
         polar={
             "radialaxis": {
@@ -129,7 +177,7 @@ def create_rain_radar_chart(hourly_dataframe: DataFrame) -> Figure:
             "angularaxis": {"tickfont": {"size": 12}, "rotation": 90, "direction": "clockwise"},
         },
         title={
-            "text": f"24-Hour Precipitation Radar in {FetcherSettings.country_name}",
+            "text": f"24-Hour Precipitation Radar in {location.name}",
             "x": 0.5,
             "xanchor": "center",
             "font": {
@@ -147,44 +195,77 @@ def create_rain_radar_chart(hourly_dataframe: DataFrame) -> Figure:
     return fig_rain
 
 
-def create_wind_spiral_chart(hourly_dataframe: DataFrame) -> Figure:
+def daily_wind_speeds(hourly_dataframes: Sequence[DataFrame]) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Get the UTC days and the mean wind speed of each day of every dataframe.
+
+    All dataframes are reduced in one grouping, keyed on the dataframe and the day. The dataframes are not changed.
+    """
+    days = [
+        hourly_dataframe["date"].dt.as_unit("s").astype("int64").to_numpy() // SECONDS_PER_DAY
+        for hourly_dataframe in hourly_dataframes
+    ]
+    keys = (np.repeat(np.arange(len(days), dtype=np.int64), [len(day) for day in days]) << 32) + np.concatenate(
+        [np.empty(0, dtype=np.int64), *days]
+    )
+    wind_speeds = pd.Series(
+        np.concatenate([hourly_dataframe["wind_speed_10m"].to_numpy() for hourly_dataframe in hourly_dataframes])
+    )
+    # The grouped mean of pandas sums with compensation in float32, which the chart values depend on.
+    means = wind_speeds.groupby(keys).mean()
+    grouped_keys = means.index.to_numpy()
+    bounds = np.searchsorted(grouped_keys >> 32, np.arange(len(days) + 1))
+    return [
+        (grouped_keys[start:end] & 0xFFFFFFFF, means.to_numpy()[start:end])
+        for start, end in itertools.pairwise(bounds)
+    ]
+
+
+def create_wind_spiral_chart(hourly_dataframe: DataFrame, location: Location) -> Figure:
     """Create a creative wind speed chart organized by date coordinates."""
-    # Use real wind speed data from API
-    hourly_dataframe["day"] = hourly_dataframe["date"].dt.date
-    daily_wind = hourly_dataframe.groupby("day")["wind_speed_10m"].mean().reset_index()
+    days, wind_speeds = daily_wind_speeds([hourly_dataframe])[0]
+    return create_wind_spiral_chart_from_daily(days, wind_speeds, location)
 
-    if len(daily_wind) == 0:
+
+def create_wind_spiral_chart_from_daily(days: np.ndarray, wind_speeds: np.ndarray, location: Location) -> Figure:
+    """Create the wind speed chart from the UTC days and their mean wind speed, sorted by day."""
+    if len(days) == 0:
         return Figure()
 
-    # Setup the seed for random, ensuring reproducibility
+    # Seeding per call keeps the chart reproducible and safe to build on several threads at once.
     # Seed is made absolute as "np.random.default_rng" expects a positive value
-    seed = int(abs(FetcherSettings.latitude + FetcherSettings.longitude))
-    random.seed(seed)
+    seed = int(abs(location.latitude + location.longitude))
     rng = np.random.default_rng(seed)
+    wind_speeds = wind_speeds.astype(np.float64)
 
     # Create organized coordinates based on dates
     # X-axis represents day of forecast (0 to n)
     # Y-axis represents wind speed scaled
     # This creates a more organized visualization than the spiral
-    daily_wind = daily_wind.sort_values("day").reset_index(drop=True)
-    wind_speeds = daily_wind["wind_speed_10m"].tolist()
-    x_coords = list(range(len(daily_wind)))  # Day index (0, 1, 2, ...)
-    y_coords = list(random.choices(wind_speeds, k=len(daily_wind)))  # noqa: S311
+    count = len(days)
+    x_coords = np.arange(count, dtype=np.float64)  # Day index (0, 1, 2, ...)
+    # Days are drawn with replacement from a Mersenne Twister seeded like random.seed, which picks the same days
+    # random.choices did when the chart seeded the global random module.
+    picks = (np.random.RandomState([seed]).random_sample(count) * count).astype(np.intp)
+    y_coords = wind_speeds[picks]
 
     # Add random deviation of 25% to x and y coordinates for more natural data visualization
-    x_deviation = rng.uniform(-0.25, 0.25, len(x_coords))  # 25% deviation
-    y_deviation = rng.uniform(-0.25, 0.25, len(y_coords))  # 25% deviation
+    x_deviation = rng.uniform(-0.25, 0.25, count)  # 25% deviation
+    y_deviation = rng.uniform(-0.25, 0.25, count)  # 25% deviation
 
     # Apply deviation - multiply by original values to maintain scale
-    x_coords = [x * (1 + dev) for x, dev in zip(x_coords, x_deviation, strict=False)]
-    y_coords = [y * (1 + dev) for y, dev in zip(y_coords, y_deviation, strict=False)]
+    x_coords *= 1 + x_deviation
+    y_coords *= 1 + y_deviation
+
+    # Plotly would send float64 arrays as they are, lists are sent as float32 by the compact transport.
+    x_coords = x_coords.tolist()
+    y_coords = y_coords.tolist()
 
     # Create color scale based on wind speed
-    colors = daily_wind["wind_speed_10m"].tolist()
-    dates = [str(d) for d in daily_wind["day"]]
+    colors = wind_speeds.tolist()
+    dates = np.datetime_as_string(days.astype("datetime64[D]")).tolist()
 
-    # Create size based on wind speed for visual emphasis
-    sizes = [max(8, min(20, speed * 1.5)) for speed in wind_speeds]
+    # Create size based on wind speed for visual emphasis, days without any wind speed get the largest size
+    sizes = np.where(np.isnan(wind_speeds), 20, np.clip(wind_speeds * 1.5, 8, 20)).tolist()
 
     fig_wind = Figure()
 
@@ -206,7 +287,7 @@ def create_wind_spiral_chart(hourly_dataframe: DataFrame) -> Figure:
             },
             line={"width": 2, "color": "rgba(100, 100, 100, 0.5)"},
             text=dates,
-            customdata=wind_speeds,
+            customdata=colors,
             hovertemplate="Date: %{text}<br>Wind Speed: %{customdata:.1f} km/h<br>Day: %{x}<extra></extra>",
             name="Wind Speed Journey",
         )
@@ -214,7 +295,7 @@ def create_wind_spiral_chart(hourly_dataframe: DataFrame) -> Figure:
 
     fig_wind.update_layout(
         title={
-            "text": (f"Wind Speed Timeline in {FetcherSettings.country_name}<br><sub>X-axis: Days from start</sub>"),
+            "text": (f"Wind Speed Timeline in {location.name}<br><sub>X-axis: Days from start</sub>"),
             "x": 0.5,
             "xanchor": "center",
             "font": {
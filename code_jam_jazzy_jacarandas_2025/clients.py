@@ -0,0 +1,99 @@
+"""Process-wide Open-Meteo clients with pooled keep-alive connections."""
+
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+import openmeteo_requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from code_jam_jazzy_jacarandas_2025.metrics import metrics
+from code_jam_jazzy_jacarandas_2025.replay import RecordingSession, ReplaySession
+from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings, Transport
+
+_clients: dict[tuple[int, str, str, str, int, int], openmeteo_requests.Client] = {}
+_lock = threading.Lock()
+
+
+def _create_session(pool_size: int) -> requests_cache.CachedSession:
+    """Create a cached, retrying session whose connections are kept alive between requests."""
+    cache_session = requests_cache.CachedSession(
+        FetcherSettings.cache_name,
+        backend=FetcherSettings.cache_backend.value,
+        expire_after=FetcherSettings.cache_expire_after,
+    )
+    retries = Retry(
+        total=5,
+        backoff_factor=0.2,
+        status_forcelist=(500, 502, 504),
+        allowed_methods=None,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    cache_session.mount("http://", adapter)
+    cache_session.mount("https://", adapter)
+    cache_session.hooks["response"].append(_record_response)
+    return cache_session
+
+
+def _record_response(response: requests_cache.AnyResponse, *_: Any, **__: Any) -> None:  # noqa: ANN401
+    """Count responses by cache status, and time the sampled ones that went over the network.
+
+    Responses that went over the network pass through the hooks twice, the first time before the cached session
+    adds their cache status. Only the second pass is counted.
+    """
+    from_cache = getattr(response, "from_cache", None)
+    if from_cache is None:
+        return
+    metrics.count("http_response", cache="hit" if from_cache else "miss", status=str(response.status_code))
+    if not from_cache and metrics.sampled():
+        metrics.observe("http_request", response.elapsed.total_seconds())
+
+
+def _create_client(transport: Transport, pool_size: int) -> openmeteo_requests.Client:
+    """Create a client sending requests to the API, recording them, or answering them from recordings."""
+    recordings = Path(FetcherSettings.recordings_path)
+    match transport:
+        case Transport.LIVE:
+            session = _create_session(pool_size)
+        case Transport.RECORD:
+            session = RecordingSession(_create_session(pool_size), recordings)
+        case Transport.REPLAY:
+            session = ReplaySession(
+                recordings,
+                latency=FetcherSettings.replay_latency,
+                jitter=FetcherSettings.replay_jitter,
+                failure_rate=FetcherSettings.replay_failure_rate,
+                seed=FetcherSettings.replay_seed,
+            )
+    # The client only calls .get() on its session, which all of these provide.
+    return openmeteo_requests.Client(session=session)  # type: ignore[reportArgumentType]
+
+
+def get_client() -> openmeteo_requests.Client:
+    """Get the shared client for this worker process, creating it on first use.
+
+    Clients are keyed by process id, so forked workers each get their own cache backend and connection pool.
+    """
+    transport = FetcherSettings.transport
+    pool_size = FetcherSettings.pool_size
+    key = (
+        os.getpid(),
+        transport.value,
+        FetcherSettings.cache_backend.value,
+        FetcherSettings.cache_name,
+        FetcherSettings.cache_expire_after,
+        pool_size,
+    )
+    if client := _clients.get(key):
+        return client
+
+    with _lock:
+        if (client := _clients.get(key)) is None:
+            with metrics.span("session_create", always=True, transport=transport.value):
+                client = _clients[key] = _create_client(transport, pool_size)
+    return client
@@ -3,6 +3,10 @@
 import reflex as rx
 
 # Import all pages so they're registered and functional.
+from .metrics import metrics_api
 from .pages import *  # noqa: F403
+from .prefetch import prefetch_locations
 
-app = rx.App()
+# The metrics endpoint is served next to the Reflex API, at /metrics on the backend.
+app = rx.App(api_transformer=metrics_api)
+app.register_lifespan_task(prefetch_locations)
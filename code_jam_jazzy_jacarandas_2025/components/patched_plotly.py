@@ -0,0 +1,53 @@
+from reflex.components.plotly.plotly import Plotly
+from reflex.vars.base import Var
+from reflex.vars.function import FunctionStringVar
+
+# Applies a patch of transport.diff_traces, every patched array keeps its first values and gets the tail after them.
+_APPLY_TRACE_PATCH = """
+const typedArrays = {f8: Float64Array, f4: Float32Array, i4: Int32Array, i2: Int16Array, u1: Uint8Array};
+
+const decodeTypedArray = (value) => {
+    if (value?.bdata === undefined) return value;
+    const bytes = Uint8Array.from(atob(value.bdata), (char) => char.charCodeAt(0));
+    return new typedArrays[value.dtype](bytes.buffer);
+};
+
+const joinArrays = (head, tail) => {
+    if (Array.isArray(head)) return [...head, ...tail];
+    const joined = new head.constructor(head.length + tail.length);
+    joined.set(head);
+    joined.set(tail, head.length);
+    return joined;
+};
+
+const applyTracePatch = (figure, patch) => {
+    if (!figure?.data || !patch?.length) return figure;
+    const data = figure.data.map((trace, index) => {
+        const patched = structuredClone(trace);
+        for (const [path, {keep, tail}] of Object.entries(patch[index] ?? {})) {
+            const keys = path.split(".");
+            const parent = keys.slice(0, -1).reduce((node, key) => node[key], patched);
+            const last = keys[keys.length - 1];
+            parent[last] = joinArrays(decodeTypedArray(parent[last]).slice(0, keep), decodeTypedArray(tail));
+        }
+        return patched;
+    });
+    return {...figure, data};
+};
+"""
+
+
+class PatchedPlotly(Plotly):
+    """Plotly chart that can apply trace patches on the client, see ``patched_figure``."""
+
+    def add_custom_code(self) -> list[str]:
+        """Add the function applying trace patches."""
+        return [_APPLY_TRACE_PATCH]
+
+
+def patched_figure(figure: Var, patch: Var) -> Var:
+    """Get the figure with the trace patch applied, which is done again whenever either changes."""
+    return FunctionStringVar.create("applyTracePatch").call(figure, patch)
+
+
+patched_plotly = PatchedPlotly.create
@@ -0,0 +1,26 @@
+from reflex.event import EventHandler
+from reflex.vars.base import Var
+
+from code_jam_jazzy_jacarandas_2025.components.patched_plotly import PatchedPlotly
+
+
+def _range_start_signature(event: Var) -> tuple[Var[str | None]]:
+    """Get the new start of the x-axis range, an empty string when it autoranges and null when it didn't move."""
+    return (
+        Var(
+            _js_expr=(
+                f'({event}?.["xaxis.range[0]"] ?? {event}?.["xaxis.range"]?.[0] '
+                f'?? ({event}?.["xaxis.autorange"] ? "" : null))'
+            ),
+            _var_type=str | None,
+        ),
+    )
+
+
+class RangePlotly(PatchedPlotly):
+    """Plotly chart that passes the start of its x-axis range to on_relayout when it is zoomed or panned."""
+
+    on_relayout: EventHandler[_range_start_signature]
+
+
+range_plotly = RangePlotly.create
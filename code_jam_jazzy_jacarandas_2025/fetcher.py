@@ -0,0 +1,498 @@
+"""Fetch weather data from Open-meteo and turn it into dataframes and charts."""
+
+from __future__ import annotations
+
+import functools
+import itertools
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import UTC, date, datetime, timedelta
+from typing import TYPE_CHECKING, Any, NamedTuple, Self, TypedDict
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+from openmeteo_sdk.Variable import Variable
+
+from code_jam_jazzy_jacarandas_2025.archive_store import archive_store
+from code_jam_jazzy_jacarandas_2025.cache import (
+    api_flight,
+    archive_flight,
+    data_version,
+    figure_cache,
+    forecast_cache,
+    patch_cache,
+    revalidator,
+)
+from code_jam_jazzy_jacarandas_2025.charts import (
+    create_candlestick_chart,
+    create_pie_chart,
+    create_rain_radar_chart,
+    create_rain_radar_chart_from_profile,
+    create_wind_spiral_chart,
+    create_wind_spiral_chart_from_daily,
+    daily_wind_speeds,
+    hourly_precipitation_profiles,
+)
+from code_jam_jazzy_jacarandas_2025.clients import get_client
+from code_jam_jazzy_jacarandas_2025.logger import app_log
+from code_jam_jazzy_jacarandas_2025.metrics import metrics
+from code_jam_jazzy_jacarandas_2025.ohlc import DailyOHLC
+from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings
+from code_jam_jazzy_jacarandas_2025.transport import (
+    ChartPayload,
+    TracePatch,
+    compact_figure,
+    diff_traces,
+    payload_size,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Sequence
+    from concurrent.futures import Future
+    from logging import Logger
+
+    import plotly.graph_objects as go
+    from numpy import ndarray
+    from openmeteo_requests import Client
+    from openmeteo_sdk.VariablesWithTime import VariablesWithTime
+    from openmeteo_sdk.VariableWithValues import VariableWithValues
+    from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+    from code_jam_jazzy_jacarandas_2025.rollups import DailyRollups
+
+# Dataframe columns the charts use, and the hourly API variables each one is summed from.
+# Other requested variables are not decoded.
+FORECAST_COLUMNS: dict[str, tuple[str, ...]] = {
+    "temperature_2m": ("temperature_2m",),
+    "precipitation": ("precipitation", "rain", "showers"),
+    "wind_speed_10m": ("wind_speed_10m",),
+}
+# Archived data feeds the daily rollups of the archive store, which cover the same columns.
+ARCHIVE_COLUMNS = FORECAST_COLUMNS
+
+_VARIABLE_NAMES = {value: name for name, value in vars(Variable).items() if not name.startswith("_")}
+
+
+class HourlyData(TypedDict):
+    """TypedDict for hourly weather data dictionary."""
+
+    date: pd.DatetimeIndex
+    temperature_2m: ndarray
+    precipitation: ndarray
+    wind_speed_10m: ndarray
+
+
+class Location(NamedTuple):
+    """A named place to fetch weather data for, in the same layout as ``CountrySlider.countries``."""
+
+    name: str
+    code: str
+    latitude: float
+    longitude: float
+
+    @classmethod
+    def from_settings(cls) -> Self:
+        """Get the default location configured in FetcherSettings."""
+        return cls(
+            FetcherSettings.country_name,
+            FetcherSettings.country_code,
+            FetcherSettings.latitude,
+            FetcherSettings.longitude,
+        )
+
+
+class WeatherFetcher:
+    """Fetch, decode and chart weather data, independent of any session."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._archive_revalidated: dict[tuple[float, float], float] = {}
+
+    @property
+    def log(self) -> Logger:
+        """Get logger for WeatherFetcher."""
+        return app_log.getChild("WeatherFetcher")
+
+    def _get_session(self) -> Client:
+        return get_client()
+
+    def get_hourly_data(
+        self, response: WeatherApiResponse
+    ) -> None | tuple[VariablesWithTime, dict[str, VariableWithValues]]:
+        """Process hourly data, with the variables keyed by the name they are requested with."""
+        hourly = response.Hourly()
+        if hourly is None:
+            return None
+
+        variables = self._extract_hourly_variables(hourly)
+
+        return (hourly, variables) if variables else None
+
+    def _extract_hourly_variables(self, hourly: VariablesWithTime) -> dict[str, VariableWithValues]:
+        return {
+            _variable_name(variable): variable
+            for i in range(hourly.VariablesLength())
+            if (variable := hourly.Variables(i)) is not None
+        }
+
+    def _get_api_params(self, locations: Sequence[Location]) -> dict[str, str | int | list[str] | list[float]]:
+        """Get API parameters for a weather data request covering one or more locations."""
+        return {
+            "latitude": [location.latitude for location in locations],
+            "longitude": [location.longitude for location in locations],
+            "hourly": FetcherSettings.hourly.split(),
+            "timezone": FetcherSettings.timezone,
+            "forecast_days": FetcherSettings.forecast_days,
+        }
+
+    def _fetch_api_data(self, locations: Sequence[Location]) -> list[pd.DataFrame | None]:
+        """Fetch and decode weather data from Open-meteo API, one dataframe per location."""
+        params = self._get_api_params(locations)
+        return self._fetch_hourly_data(FetcherSettings.api_url, params, FORECAST_COLUMNS)
+
+    def _fetch_api_archive_data(
+        self, locations: Sequence[Location], start_date: date, end_date: date
+    ) -> list[pd.DataFrame | None]:
+        """Fetch and decode archived weather data between two days (inclusive), one dataframe per location."""
+        params = self._get_api_params(locations)
+        del params["forecast_days"]
+        params["hourly"] = [name for sources in ARCHIVE_COLUMNS.values() for name in sources]
+
+        params.update(
+            {
+                "start_date": start_date.strftime("%Y-%m-%d"),
+                "end_date": end_date.strftime("%Y-%m-%d"),
+            }
+        )
+
+        return self._fetch_hourly_data(FetcherSettings.archive_api_url, params, ARCHIVE_COLUMNS)
+
+    def _fetch_hourly_data(
+        self, url: str, params: dict[str, Any], columns: dict[str, tuple[str, ...]]
+    ) -> list[pd.DataFrame | None]:
+        """Fetch and decode hourly data, concurrent identical fetches share one upstream call and one decode."""
+        api = urlsplit(url).hostname or url
+
+        def fetch() -> list[pd.DataFrame | None]:
+            with metrics.span("api_call", api=api):
+                responses = self._get_session().weather_api(url, params=params)
+            with metrics.span("decode", api=api):
+                return [self._process_hourly_data(response, columns) for response in responses]
+
+        return api_flight.do((url, _normalize_params(params), tuple(columns.items())), fetch)
+
+    @staticmethod
+    def _forecast_key(location: Location) -> tuple[float, float, int]:
+        return location.latitude, location.longitude, FetcherSettings.forecast_days
+
+    def fetch_forecast(self, location: Location, *, refresh: bool = False) -> pd.DataFrame | None:
+        """Get the hourly forecast for a location, fetching it only when it isn't cached yet.
+
+        With refresh, the forecast is always fetched and replaces the cached one.
+        """
+        key = self._forecast_key(location)
+        if refresh:
+            return forecast_cache.refresh(key, lambda: self._fetch_forecast(location))
+        return forecast_cache.get_or_build(key, lambda: self._fetch_forecast(location))
+
+    def _fetch_forecast(self, location: Location) -> pd.DataFrame | None:
+        return self._fetch_api_data([location])[0]
+
+    def cache_forecast(self, location: Location, forecast: pd.DataFrame) -> None:
+        """Cache a forecast of a location fetched elsewhere, like by the prefetch scheduler of another worker."""
+        forecast_cache.put(self._forecast_key(location), forecast)
+
+    def revalidate_forecast(self, location: Location) -> Future[pd.DataFrame | None] | None:
+        """Refresh the cached forecast of a location in the background once it is stale.
+
+        Get the running refresh, or None when there is nothing to refresh.
+        """
+        return forecast_cache.revalidate(self._forecast_key(location), lambda: self._fetch_forecast(location))
+
+    def fetch_forecasts(self, locations: Sequence[Location], *, refresh: bool = False) -> list[pd.DataFrame | None]:
+        """Get the hourly forecasts for many locations, fetching the uncached ones batch_size locations per request.
+
+        With refresh, all forecasts are fetched and replace the cached ones.
+        """
+        forecasts = {
+            location: None if refresh else forecast_cache.get(self._forecast_key(location)) for location in locations
+        }
+        missing = [location for location, forecast in forecasts.items() if forecast is None]
+
+        for batch in itertools.batched(missing, FetcherSettings.batch_size):
+            for location, forecast in zip(batch, self._fetch_api_data(batch), strict=True):
+                if forecast is not None:
+                    forecast_cache.put(self._forecast_key(location), forecast)
+                forecasts[location] = forecast
+
+        return [forecasts[location] for location in locations]
+
+    def revalidate_archive(self, location: Location) -> Future[DailyRollups | None] | None:
+        """Fetch the days missing from the held archive of a location in the background, at most once per soft TTL.
+
+        Get the running fetch, or None when nothing is held yet or there is nothing to fetch.
+        """
+        held = archive_store.held_range(location.latitude, location.longitude)
+        today = datetime.now(UTC).date()
+        start_date = today - timedelta(days=FetcherSettings.lookback_days)
+        if held is None or not archive_store.missing_ranges(location.latitude, location.longitude, start_date, today):
+            return None
+
+        # The archive lags behind by a few days, so the newest days stay missing for a while.
+        key = (location.latitude, location.longitude)
+        now = time.monotonic()
+        with self._lock:
+            if now < self._archive_revalidated.get(key, -math.inf) + FetcherSettings.forecast_soft_ttl:
+                return None
+            self._archive_revalidated[key] = now
+        return revalidator.submit(("archive", key), lambda: self.load_history(location))
+
+    def load_history(
+        self, location: Location, *, stale_ok: bool = False, days: int | None = None
+    ) -> DailyRollups | None:
+        """Load the daily rollups of the lookback window, fetching only the days the archive store doesn't hold yet.
+
+        With stale_ok, the held days are returned without fetching anything, unless none are held.
+        Only the newest days of the window are read when given, the whole window is fetched either way.
+        """
+        if stale_ok and archive_store.held_range(location.latitude, location.longitude) is not None:
+            today = datetime.now(UTC).date()
+            return self._read_history(location, _history_start(today, days), today)
+        return self.load_histories([location], days=days)[0]
+
+    def load_histories(self, locations: Sequence[Location], *, days: int | None = None) -> list[DailyRollups | None]:
+        """Load the daily rollups of the lookback window of many locations, fetching missing days in batches."""
+        _, today = self._fetch_archives(locations)
+        return [self._read_history(location, _history_start(today, days), today) for location in locations]
+
+    def _read_history(self, location: Location, start_date: date, end_date: date) -> DailyRollups | None:
+        with metrics.span("rollups_read"):
+            return archive_store.read_rollups(location.latitude, location.longitude, start_date, end_date)
+
+    def _fetch_archives(self, locations: Sequence[Location]) -> tuple[date, date]:
+        """Fetch the days of the lookback window the archive store doesn't hold, get the first and last day.
+
+        Locations missing the same days are fetched together, batch_size locations per request.
+        """
+        today = datetime.now(UTC).date()
+        start_date = today - timedelta(days=FetcherSettings.lookback_days)
+
+        missing: defaultdict[tuple[date, date], list[Location]] = defaultdict(list)
+        for location in locations:
+            for missing_range in archive_store.missing_ranges(
+                location.latitude, location.longitude, start_date, today
+            ):
+                missing[missing_range].append(location)
+
+        for (missing_start, missing_end), missing_locations in missing.items():
+            for batch in itertools.batched(missing_locations, FetcherSettings.batch_size):
+                key = (
+                    missing_start,
+                    missing_end,
+                    tuple((location.latitude, location.longitude) for location in batch),
+                )
+                archive_flight.do(key, functools.partial(self._fetch_archive_batch, batch, missing_start, missing_end))
+
+        return start_date, today
+
+    def _fetch_archive_batch(self, batch: Sequence[Location], start_date: date, end_date: date) -> None:
+        """Fetch archived data between two days (inclusive) and write it to the archive store.
+
+        Concurrent fetches of the same batch share one fetch and one write, see ``archive_flight``.
+        """
+        self.log.debug("Fetching archive data from %s to %s for %d locations", start_date, end_date, len(batch))
+        dataframes = self._fetch_api_archive_data(batch, start_date, end_date)
+        for location, dataframe in zip(batch, dataframes, strict=True):
+            if dataframe is not None:
+                archive_store.write(location.latitude, location.longitude, dataframe)
+
+    def _process_hourly_data(
+        self, response: WeatherApiResponse, columns: dict[str, tuple[str, ...]] = FORECAST_COLUMNS
+    ) -> pd.DataFrame | None:
+        """Process hourly weather data into a DataFrame, decoding only the given columns."""
+        if data := self.get_hourly_data(response):
+            hourly, hourly_variables = data
+        else:
+            return None
+
+        sources = {
+            column: found
+            for column, names in columns.items()
+            if (found := [hourly_variables[name] for name in names if name in hourly_variables])
+        }
+        if not sources:
+            return None
+
+        # The time index is built once from the start and interval, without parsing any dates.
+        hours = (hourly.TimeEnd() - hourly.Time()) // hourly.Interval()
+        date_range = pd.date_range(
+            start=pd.Timestamp(hourly.Time(), unit="s", tz="UTC"),
+            periods=hours,
+            freq=pd.Timedelta(seconds=hourly.Interval()),
+        )
+
+        # All variables are copied straight from the response buffer into one contiguous float32 block,
+        # which becomes the single block of the dataframe.
+        block = np.empty((len(sources), hours), dtype=np.float32)
+        for row, (first, *others) in zip(block, sources.values(), strict=True):
+            row[:] = first.ValuesAsNumpy()
+            for other in others:
+                np.add(row, other.ValuesAsNumpy(), out=row)
+
+        hourly_dataframe = pd.DataFrame(block.T, columns=list(sources), copy=False)
+        hourly_dataframe.insert(0, "date", date_range)
+        return hourly_dataframe
+
+    def create_ohlc_dataframe(self, hourly_dataframe: pd.DataFrame) -> pd.DataFrame:
+        """Convert hourly data to OHLC (Open, High, Low, Close) format."""
+        return DailyOHLC(hourly_dataframe).frame
+
+    def _cached_chart(
+        self,
+        location: Location,
+        builder: Callable[[pd.DataFrame, Location], go.Figure],
+        dataframe: pd.DataFrame,
+        version: int,
+    ) -> str:
+        """Build a chart payload, or reuse the one built by any session from the same version of the data.
+
+        Get the key of the payload in the figure cache.
+        """
+        key = self._chart_key(location, builder.__name__, version)
+        figure_cache.get_or_build(key, lambda: _build_payload(builder.__name__, lambda: builder(dataframe, location)))
+        return key
+
+    @staticmethod
+    def _chart_key(location: Location, chart: str, version: int) -> str:
+        """Get the figure cache key of a chart, a string so sessions can hold it instead of the chart."""
+        return (
+            f"{chart}:{location.latitude}:{location.longitude}:"
+            f"{FetcherSettings.forecast_days}:{FetcherSettings.lookback_days}:{version}"
+        )
+
+    def chart_payload(self, key: str) -> ChartPayload | None:
+        """Get a chart payload built before, or None when it was dropped from the figure cache."""
+        return figure_cache.get(key) if key else None
+
+    def chart_patch(self, base_key: str, key: str) -> TracePatch | None:
+        """Get the patch turning the traces of one chart into those of another, built once for all sessions.
+
+        Get None when either chart was dropped from the figure cache, when the traces can't be patched, or when the
+        patch is more than half the size of the traces, then sending the traces again is about as cheap.
+        """
+        base, payload = self.chart_payload(base_key), self.chart_payload(key)
+        # The patch may outlive its base, but it can only be applied to it.
+        if base is None or payload is None or base_key == key:
+            return None
+
+        def build() -> TracePatch | None:
+            with metrics.span("chart_patch"):
+                patch = diff_traces(base["data"], payload["data"])
+            if patch is None or payload_size(patch) * 2 > payload_size({"data": payload["data"], "layout": {}}):
+                return None
+            return patch
+
+        return patch_cache.get_or_build((base_key, key), build)
+
+    def build_rain_radar_charts(
+        self, locations: Sequence[Location], hourly_dataframes: Sequence[pd.DataFrame]
+    ) -> list[str]:
+        """Build the rain radar charts of many locations, aggregating all of their data in one pass."""
+        profiles = hourly_precipitation_profiles(hourly_dataframes)
+        keys = []
+        for location, hourly_dataframe, profile in zip(locations, hourly_dataframes, profiles, strict=True):
+            key = self._chart_key(location, create_rain_radar_chart.__name__, data_version(hourly_dataframe))
+            figure_cache.get_or_build(
+                key,
+                lambda location=location, profile=profile: _build_payload(
+                    create_rain_radar_chart.__name__, lambda: create_rain_radar_chart_from_profile(profile, location)
+                ),
+            )
+            keys.append(key)
+        return keys
+
+    def build_wind_spiral_charts(
+        self, locations: Sequence[Location], hourly_dataframes: Sequence[pd.DataFrame]
+    ) -> list[str]:
+        """Build the wind speed charts of many locations, averaging all of their days in one grouping."""
+        keys = []
+        for location, hourly_dataframe, (days, wind_speeds) in zip(
+            locations, hourly_dataframes, daily_wind_speeds(hourly_dataframes), strict=True
+        ):
+            key = self._chart_key(location, create_wind_spiral_chart.__name__, data_version(hourly_dataframe))
+            figure_cache.get_or_build(
+                key,
+                lambda location=location, days=days, wind_speeds=wind_speeds: _build_payload(
+                    create_wind_spiral_chart.__name__,
+                    lambda: create_wind_spiral_chart_from_daily(days, wind_speeds, location),
+                ),
+            )
+            keys.append(key)
+        return keys
+
+    def build_forecast_charts(
+        self, location: Location, hourly_dataframe: pd.DataFrame, ohlc: DailyOHLC
+    ) -> tuple[str, str, str, str]:
+        """Build all charts from the forecast data only, ohlc holds the daily values of the same data.
+
+        Get the keys of the charts in the figure cache.
+        """
+        version = data_version(hourly_dataframe)
+        return (
+            self._cached_chart(location, create_candlestick_chart, ohlc.frame, version),
+            self._cached_chart(location, create_pie_chart, ohlc.frame, version),
+            self._cached_chart(location, create_rain_radar_chart, hourly_dataframe, version),
+            self._cached_chart(location, create_wind_spiral_chart, hourly_dataframe, version),
+        )
+
+    def build_candlestick_chart(self, location: Location, ohlc: DailyOHLC) -> str:
+        """Build the candlestick chart over the archive and forecast data, get its key in the figure cache.
+
+        Only the forecast and the latest history are sent as daily bars, older history as weekly and monthly bars.
+        """
+
+        def build() -> go.Figure:
+            daily, coarse = ohlc.level_of_detail(
+                FetcherSettings.forecast_days + FetcherSettings.candlestick_daily_days,
+                FetcherSettings.candlestick_weekly_days,
+            )
+            return create_candlestick_chart(daily, location, coarse)
+
+        key = self._chart_key(location, create_candlestick_chart.__name__, data_version(ohlc.frame))
+        figure_cache.get_or_build(key, lambda: _build_payload(create_candlestick_chart.__name__, build))
+        return key
+
+
+def _build_payload(chart: str, build: Callable[[], go.Figure]) -> ChartPayload:
+    """Build a figure and encode it for the frontend, timing both stages."""
+    with metrics.span("chart", chart=chart):
+        figure = build()
+    with metrics.span("compact_figure", chart=chart):
+        return compact_figure(figure)
+
+
+def _history_start(today: date, days: int | None) -> date:
+    """Get the first day of the newest days of the lookback window, or of the whole window."""
+    lookback_days = FetcherSettings.lookback_days
+    return today - timedelta(days=lookback_days if days is None else min(days, lookback_days))
+
+
+def _normalize_params(params: dict[str, Any]) -> tuple[tuple[str, Hashable], ...]:
+    """Turn API parameters into a hashable key that doesn't depend on their order."""
+    return tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in params.items()))
+
+
+def _variable_name(variable: VariableWithValues) -> str:
+    """Get the name a variable is requested with, e.g. temperature_2m for the temperature at 2 metres."""
+    name = _VARIABLE_NAMES.get(variable.Variable(), "unknown")
+    if altitude := variable.Altitude():
+        return f"{name}_{altitude}m"
+    if pressure_level := variable.PressureLevel():
+        return f"{name}_{pressure_level}hPa"
+    return name
+
+
+weather_fetcher = WeatherFetcher()
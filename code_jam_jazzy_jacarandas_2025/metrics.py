@@ -0,0 +1,141 @@
+"""Sampled timing spans and counters, aggregated in memory and served as JSON on a local endpoint.
+
+Spans are timed for a sampled fraction of calls only, the others cost a random draw. Every span name and label set
+gets its own histogram with log-spaced buckets, so percentiles can be read without keeping the samples.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextlib
+import random
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from starlette.requests import Request
+
+# Upper bounds of the histogram buckets in seconds, from 0.1 ms to about 52 s.
+BUCKETS = tuple(0.0001 * 2**i for i in range(20))
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+type Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Count observations per bucket, with their total."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Get the upper bound of the bucket holding the given quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip((*BUCKETS, float("inf")), self.counts, strict=True):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict[str, object]:
+        """Get the histogram as plain data."""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {f"{bound:g}": count for bound, count in zip(BUCKETS, self.counts, strict=False) if count},
+        }
+
+
+class Metrics:
+    """Thread-safe registry of span histograms and counters."""
+
+    def __init__(self, sample_rate: float) -> None:
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._counters: dict[tuple[str, Labels], int] = {}
+
+    def sampled(self) -> bool:
+        """Draw whether to time the next span."""
+        return random.random() < self.sample_rate  # noqa: S311
+
+    @contextlib.contextmanager
+    def span(self, name: str, /, *, always: bool = False, **labels: str) -> Iterator[None]:
+        """Time the block for a sampled fraction of calls, or every call for rare events."""
+        if not always and not self.sampled():
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Add a duration to the histogram of a span."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name: str, **labels: str) -> None:
+        """Increment a counter, counters are not sampled."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def snapshot(self) -> dict[str, object]:
+        """Get all histograms and counters as plain data."""
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "spans": [
+                    {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+            }
+
+
+metrics = Metrics(sample_rate=FetcherSettings.metrics_sample_rate)
+
+
+async def _metrics_endpoint(request: Request) -> Response:
+    """Serve the metrics of this worker to local clients only."""
+    if request.client is None or request.client.host not in LOCAL_HOSTS:
+        return Response(status_code=403)
+
+    # Imported here, the cache module is only needed once someone asks for metrics.
+    from code_jam_jazzy_jacarandas_2025.cache import api_flight  # noqa: PLC0415
+
+    return JSONResponse({**metrics.snapshot(), "api_flights": api_flight.stats()})
+
+
+metrics_api = Starlette(routes=[Route("/metrics", _metrics_endpoint)])
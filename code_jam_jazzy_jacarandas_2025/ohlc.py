@@ -0,0 +1,198 @@
+"""Daily OHLC (Open, High, Low, Close) temperatures computed with NumPy reductions over day boundaries.
+
+The hourly temperatures are kept next to the daily values, so appending hours only aggregates the days they touch.
+Older days can also be prepended straight from the archive rollups, without their hours.
+For long ranges, the older days can be merged into weekly and monthly bars, see ``DailyOHLC.level_of_detail``.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from code_jam_jazzy_jacarandas_2025.rollups import SECONDS_PER_DAY, period_starts, run_starts
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+
+    from code_jam_jazzy_jacarandas_2025.rollups import DailyRollups, Period
+
+
+class DailyOHLC:
+    """Daily open, high, low and close temperatures of an hourly series, in UTC days."""
+
+    def __init__(self, hourly_dataframe: pd.DataFrame | None = None) -> None:
+        if hourly_dataframe is None:
+            self._times = np.empty(0, dtype=np.int64)
+            self._temperatures = np.empty(0, dtype=np.float32)
+        else:
+            times = hourly_dataframe["date"].dt.as_unit("s").astype("int64").to_numpy()
+            temperatures = hourly_dataframe["temperature_2m"].to_numpy()
+            if np.any(times[1:] < times[:-1]):
+                order = np.argsort(times, kind="stable")
+                times, temperatures = times[order], temperatures[order]
+            # Hours without a temperature are skipped, days without any are left out.
+            valid = ~np.isnan(temperatures)
+            self._times = times[valid]
+            self._temperatures = temperatures[valid]
+
+        self._days, self._open, self._high, self._low, self._close = _aggregate(self._times, self._temperatures)
+        self._frame: pd.DataFrame | None = None
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Get the daily values as a dataframe with date, Open, High, Low and Close columns."""
+        if self._frame is None:
+            self._frame = _ohlc_frame(*self._daily())
+        return self._frame
+
+    def level_of_detail(
+        self, daily_days: int, weekly_days: int
+    ) -> tuple[pd.DataFrame, list[tuple[Period, pd.DataFrame]]]:
+        """Get daily bars for the newest days and coarser bars for the days before them, in the layout of ``frame``.
+
+        The newest daily_days are kept as daily bars, from the Monday before them. The weekly_days before those are
+        merged into weekly bars, from the start of their month, and every older day into monthly bars. Bars are merged
+        as the first open, highest high, lowest low and last close. Get the daily bars and the coarser bars per period,
+        oldest first, leaving out empty periods.
+        """
+        if not len(self._days):
+            return self.frame, []
+
+        daily_start = period_starts(self._days[-1:] - daily_days + 1, "week")[0]
+        weekly_start = period_starts(np.array([daily_start - weekly_days]), "month")[0]
+        first_weekly, first_daily = np.searchsorted(self._days, [weekly_start, daily_start])
+        if first_daily == 0:
+            return self.frame, []
+
+        coarse: list[tuple[Period, pd.DataFrame]] = [
+            ("month", self._bars(slice(0, first_weekly), "month", None)),
+            ("week", self._bars(slice(first_weekly, first_daily), "week", weekly_start)),
+        ]
+        daily = _ohlc_frame(*(values[first_daily:] for values in self._daily()))
+        return daily, [(period, bars) for period, bars in coarse if len(bars)]
+
+    def append(self, hourly_dataframe: pd.DataFrame) -> None:
+        """Add newer hours, replacing held hours from the first new one onward.
+
+        Only the days of the new hours are aggregated, and the day they start in when it already held earlier hours.
+        """
+        self._join(DailyOHLC(hourly_dataframe))
+
+    def prepend(self, hourly_dataframe: pd.DataFrame) -> None:
+        """Add older hours, the held hours win where they overlap. The held days are not aggregated again."""
+        earlier = DailyOHLC(hourly_dataframe)
+        earlier._join(self)
+        self._take(earlier)
+
+    def prepend_rollups(self, rollups: DailyRollups) -> None:
+        """Add the daily values of older days from rollups, days from the first held day onward are left out."""
+        older = rollups.days < self._days[0] if len(self._days) else np.ones(len(rollups), dtype=bool)
+        daily = (
+            rollups.days[older],
+            rollups.column("open")[older],
+            rollups.column("high")[older],
+            rollups.column("low")[older],
+            rollups.column("close")[older],
+        )
+        self._days, self._open, self._high, self._low, self._close = (
+            np.concatenate([theirs, mine]) for theirs, mine in zip(daily, self._daily(), strict=True)
+        )
+        self._frame = None
+
+    def _join(self, later: DailyOHLC) -> None:
+        """Extend with a later series, reusing the daily values of both except for the day where they meet."""
+        if not len(later._times):
+            return
+        if not len(self._days):
+            self._take(later)
+            return
+
+        cut = later._times[0]
+        boundary_day = later._days[0]
+        kept_hours = np.searchsorted(self._times, cut)
+        kept_days = np.searchsorted(self._days, boundary_day)
+
+        times = np.concatenate([self._times[:kept_hours], later._times])
+        temperatures = np.concatenate([self._temperatures[:kept_hours], later._temperatures])
+
+        boundary_start = np.searchsorted(times, boundary_day * SECONDS_PER_DAY)
+        if boundary_start == kept_hours:
+            # The later series starts on a new day, its daily values can be used as they are.
+            joined = [
+                np.concatenate([mine[:kept_days], theirs])
+                for mine, theirs in zip(self._daily(), later._daily(), strict=True)
+            ]
+        else:
+            boundary_end = np.searchsorted(times, (boundary_day + 1) * SECONDS_PER_DAY)
+            boundary = _aggregate(times[boundary_start:boundary_end], temperatures[boundary_start:boundary_end])
+            joined = [
+                np.concatenate([mine[:kept_days], day, theirs[1:]])
+                for mine, day, theirs in zip(self._daily(), boundary, later._daily(), strict=True)
+            ]
+
+        self._times, self._temperatures = times, temperatures
+        self._days, self._open, self._high, self._low, self._close = joined
+        self._frame = None
+
+    def _daily(self) -> tuple[ndarray, ndarray, ndarray, ndarray, ndarray]:
+        return self._days, self._open, self._high, self._low, self._close
+
+    def _bars(self, rows: slice, period: Period, first_day: int | None) -> pd.DataFrame:
+        """Merge the given daily rows into bars per period, the first bar starts at first_day when it is later."""
+        days = self._days[rows]
+        keys = period_starts(days, period)
+        if first_day is not None:
+            keys = np.maximum(keys, first_day)
+        if not len(keys):
+            return _ohlc_frame(keys, *(values[rows] for values in self._daily()[1:]))
+
+        starts = run_starts(keys)
+        ends = np.append(starts[1:], len(keys)) - 1
+        return _ohlc_frame(
+            keys[starts],
+            self._open[rows][starts],
+            np.maximum.reduceat(self._high[rows], starts),
+            np.minimum.reduceat(self._low[rows], starts),
+            self._close[rows][ends],
+        )
+
+    def _take(self, other: DailyOHLC) -> None:
+        self._times, self._temperatures = other._times, other._temperatures
+        self._days, self._open, self._high, self._low, self._close = other._daily()
+        self._frame = other._frame
+
+
+def _ohlc_frame(days: ndarray, open_: ndarray, high: ndarray, low: ndarray, close: ndarray) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(days * SECONDS_PER_DAY, unit="s", utc=True),
+            "Open": open_.round(2),
+            "High": high.round(2),
+            "Low": low.round(2),
+            "Close": close.round(2),
+        }
+    )
+
+
+def _aggregate(times: ndarray, temperatures: ndarray) -> tuple[ndarray, ndarray, ndarray, ndarray, ndarray]:
+    """Reduce sorted hourly temperatures to daily values, with one reduction per value over all days at once."""
+    days = times // SECONDS_PER_DAY
+    if not len(days):
+        empty = temperatures[:0]
+        return days, empty, empty, empty, empty
+
+    starts = run_starts(days)
+    ends = np.append(starts[1:], len(days)) - 1
+    return (
+        days[starts],
+        temperatures[starts],
+        np.maximum.reduceat(temperatures, starts),
+        np.minimum.reduceat(temperatures, starts),
+        temperatures[ends],
+    )
@@ -1,8 +1,21 @@
+import plotly.graph_objects as go
 import reflex as rx
 
 from code_jam_jazzy_jacarandas_2025.components.layout import base_layout
+from code_jam_jazzy_jacarandas_2025.components.patched_plotly import patched_figure, patched_plotly
+from code_jam_jazzy_jacarandas_2025.components.range_plotly import range_plotly
 from code_jam_jazzy_jacarandas_2025.sliders import CountrySlider
-from code_jam_jazzy_jacarandas_2025.states import FetcherState
+from code_jam_jazzy_jacarandas_2025.states import CHARTS, FetcherState
+
+
+def _chart(name: str) -> rx.Component:
+    """Render a chart from its patched traces and layout, the template is part of the compiled page."""
+    data = patched_figure(getattr(FetcherState, f"{name}_chart"), getattr(FetcherState, f"{name}_patch"))
+    layout = getattr(FetcherState, f"{name}_layout")
+    if name == "ohcl_temp":
+        # Zooming or panning out loads the older history of the candlestick chart.
+        return range_plotly(data=data.to(go.Figure), layout=layout, on_relayout=FetcherState.load_candlestick_range)
+    return patched_plotly(data=data.to(go.Figure), layout=layout)
 
 
 @rx.page("/", on_load=FetcherState.fetch_weather_data)
@@ -17,10 +30,7 @@ def index() -> rx.Component:
         rx.cond(
             FetcherState.loaded,
             rx.grid(
-                rx.plotly(data=FetcherState.ohcl_temp_chart),
-                rx.plotly(data=FetcherState.pie_temp_chart),
-                rx.plotly(data=FetcherState.rain_radar_chart),
-                rx.plotly(data=FetcherState.wind_speed_chart),
+                *(_chart(name) for name in CHARTS),
                 columns="repeat(2, 1fr)",
                 rows="repeat(2, auto)",
                 gap=4,
@@ -0,0 +1,227 @@
+"""Background refresh of weather data for every selectable country."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import sys
+import time
+from typing import IO, TYPE_CHECKING
+
+from code_jam_jazzy_jacarandas_2025.archive_store import archive_store
+from code_jam_jazzy_jacarandas_2025.fetcher import Location, weather_fetcher
+from code_jam_jazzy_jacarandas_2025.logger import app_log
+from code_jam_jazzy_jacarandas_2025.ohlc import DailyOHLC
+from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings
+from code_jam_jazzy_jacarandas_2025.sliders import CountrySlider
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import pandas as pd
+
+    from code_jam_jazzy_jacarandas_2025.rollups import DailyRollups
+
+log = app_log.getChild("prefetch")
+
+# Every refreshed location costs one forecast call and at most one archive call.
+# Open-Meteo counts each location of a batched request as a separate call.
+CALLS_PER_LOCATION = 2
+
+# Held open by the worker running the scheduler, the OS releases the lock when that worker exits.
+_scheduler_lock: IO[bytes] | None = None
+
+
+class RateLimiter:
+    """Token bucket limiting how many API requests are started per minute."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.rate = per_minute / 60
+        self.capacity = max(FetcherSettings.batch_size * CALLS_PER_LOCATION, per_minute // 10)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 1) -> None:
+        """Wait until the given amount of requests fits in the budget."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+def _acquire_scheduler_lock() -> bool:
+    """Take the lock that lets a single worker process of this machine run the scheduler, without waiting for it.
+
+    The lock file lives next to the archive store, which all workers share.
+    """
+    global _scheduler_lock  # noqa: PLW0603
+    if _scheduler_lock is not None:
+        return True
+
+    archive_store.root.mkdir(parents=True, exist_ok=True)
+    lock_file = (archive_store.root / "prefetch.lock").open("a+b")
+    try:
+        if sys.platform == "win32":
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _scheduler_lock = lock_file
+    return True
+
+
+def _next_cycle_start(now: float) -> float:
+    """Get the next time the weather models have published a new run, with a delay for them to land."""
+    interval = FetcherSettings.prefetch_interval
+    return (now // interval + 1) * interval + FetcherSettings.prefetch_offset
+
+
+def _refresh_locations(locations: Sequence[Location]) -> None:
+    forecasts = weather_fetcher.fetch_forecasts(locations, refresh=True)
+    # Sessions start out with a short tail of history, older days load when the chart is zoomed out to them.
+    histories = weather_fetcher.load_histories(locations, days=FetcherSettings.candlestick_history_days)
+    # The other workers fill their caches from the written forecasts, once the history of the location is held.
+    for location, forecast in zip(locations, forecasts, strict=True):
+        if forecast is not None:
+            archive_store.write_forecast(location.latitude, location.longitude, forecast)
+    _build_charts(locations, forecasts, histories)
+
+
+def _warm_locations(locations: Sequence[Location], warmed: dict[Location, float]) -> None:
+    """Cache the forecasts the scheduler wrote since they were last read in this worker, and build their charts.
+
+    Nothing is fetched, the candlestick chart is only built from history the archive store already holds.
+    """
+    shared: list[tuple[Location, pd.DataFrame]] = []
+    for location in locations:
+        written = archive_store.read_forecast(location.latitude, location.longitude)
+        if written is None or warmed.get(location) == written[0]:
+            continue
+        warmed[location], forecast = written
+        weather_fetcher.cache_forecast(location, forecast)
+        shared.append((location, forecast))
+
+    histories = [
+        weather_fetcher.load_history(location, stale_ok=True, days=FetcherSettings.candlestick_history_days)
+        if archive_store.held_range(location.latitude, location.longitude) is not None
+        else None
+        for location, _ in shared
+    ]
+    _build_charts([location for location, _ in shared], [forecast for _, forecast in shared], histories)
+
+
+def _build_charts(
+    locations: Sequence[Location],
+    forecasts: Sequence[pd.DataFrame | None],
+    histories: Sequence[DailyRollups | None],
+) -> None:
+    """Build the charts of every location into the figure cache, the way sessions request them."""
+    # The rain radar and wind charts of the whole batch come from a single aggregation each,
+    # the per location builds reuse them.
+    fetched = [
+        (location, forecast) for location, forecast in zip(locations, forecasts, strict=True) if forecast is not None
+    ]
+    if fetched:
+        fetched_locations = [location for location, _ in fetched]
+        fetched_forecasts = [forecast for _, forecast in fetched]
+        weather_fetcher.build_rain_radar_charts(fetched_locations, fetched_forecasts)
+        weather_fetcher.build_wind_spiral_charts(fetched_locations, fetched_forecasts)
+    daily = [DailyOHLC(forecast) if forecast is not None else DailyOHLC() for forecast in forecasts]
+    for location, forecast, ohlc in zip(locations, forecasts, daily, strict=True):
+        if forecast is not None:
+            weather_fetcher.build_forecast_charts(location, forecast, ohlc)
+
+    for location, history, ohlc in zip(locations, histories, daily, strict=True):
+        if history is not None:
+            ohlc.prepend_rollups(history)
+            weather_fetcher.build_candlestick_chart(location, ohlc)
+
+
+def _log_memory_usage(locations: Sequence[Location]) -> None:
+    """Log the archive files held per location, which the workers share through the page cache."""
+    usage = {location.code: archive_store.file_sizes(location.latitude, location.longitude) for location in locations}
+    held = {code: sizes for code, sizes in usage.items() if any(sizes)}
+    log.info(
+        "Archive store holds %.1f MiB of hours and %.1f KiB of daily rollups for %d locations",
+        sum(hourly for hourly, _ in held.values()) / 2**20,
+        sum(daily for _, daily in held.values()) / 2**10,
+        len(held),
+    )
+    for code, (hourly, daily) in sorted(held.items(), key=lambda item: sum(item[1]), reverse=True):
+        log.debug(
+            "Archive store holds %.1f KiB of hours and %.1f KiB of daily rollups for %s",
+            hourly / 2**10,
+            daily / 2**10,
+            code,
+        )
+
+
+async def _warm(locations: Sequence[Location], warmed: dict[Location, float]) -> None:
+    try:
+        await asyncio.to_thread(_warm_locations, locations, warmed)
+    except Exception:
+        log.exception("Failed to read the prefetched weather data")
+
+
+async def _refresh(locations: Sequence[Location], semaphore: asyncio.Semaphore, limiter: RateLimiter) -> None:
+    async with semaphore:
+        await limiter.acquire(len(locations) * CALLS_PER_LOCATION)
+        try:
+            await asyncio.to_thread(_refresh_locations, locations)
+        except Exception:
+            log.exception("Failed to prefetch weather data for %s", ", ".join(location.name for location in locations))
+
+
+async def prefetch_locations() -> None:
+    """Keep the weather data of every country in the slider warm.
+
+    All countries are fetched on startup. After that, every cycle starts shortly after the models update.
+    Countries are fetched in batches, which are staggered evenly over the cycle so the refresh load stays flat.
+    Only one worker process runs the scheduler, so the rate limit holds for the whole machine. It writes the fetched
+    forecasts to the archive store, the other workers fill their own caches from those as they land. They check
+    whether they can take over at the same time, in case that worker exited.
+    """
+    if not FetcherSettings.prefetch_enabled:
+        return
+
+    locations = [Location(*country) for country in CountrySlider.countries]
+    batches = list(itertools.batched(locations, FetcherSettings.batch_size))
+    warmed: dict[Location, float] = {}
+    while True:
+        if _acquire_scheduler_lock():
+            break
+        await _warm(locations, warmed)
+        # The scheduler refreshes a batch every step of the cycle.
+        await asyncio.sleep(FetcherSettings.prefetch_interval / len(batches))
+    log.info("Running the prefetch scheduler in this worker")
+
+    semaphore = asyncio.Semaphore(FetcherSettings.prefetch_concurrency)
+    limiter = RateLimiter(FetcherSettings.prefetch_requests_per_minute)
+    running: set[asyncio.Task[None]] = set()
+
+    cycle_start = time.time()
+    step = 0.0
+    while True:
+        _log_memory_usage(locations)
+        log.debug("Prefetching weather data for %d locations in %d batches", len(locations), len(batches))
+        for i, batch in enumerate(batches):
+            await asyncio.sleep(max(0.0, cycle_start + i * step - time.time()))
+            task = asyncio.create_task(_refresh(batch, semaphore, limiter))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+        cycle_start = _next_cycle_start(time.time())
+        step = FetcherSettings.prefetch_interval / len(batches)
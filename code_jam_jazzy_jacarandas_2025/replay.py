@@ -0,0 +1,118 @@
+"""Record Open-Meteo responses to disk and replay them, to run the fetch path without the network.
+
+The sessions only implement the ``get`` call ``openmeteo_requests.Client`` makes, and can be passed to it in place of
+a ``requests.Session``. Replay adds configurable latency and failures, so the pipeline can be load tested locally.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import UTC, date, datetime
+from typing import TYPE_CHECKING, Any
+
+from code_jam_jazzy_jacarandas_2025.logger import app_log
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import requests
+
+log = app_log.getChild("replay")
+
+# Request parameters holding a day, which are recorded relative to the day of the request.
+DATE_PARAMS = ("start_date", "end_date")
+
+
+class ReplayError(Exception):
+    """Raised for a failed replayed request."""
+
+
+class ReplayResponse:
+    """The parts of a ``requests.Response`` that ``openmeteo_requests.Client`` uses."""
+
+    def __init__(self, url: str, status_code: int, content: bytes) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+
+    def json(self) -> Any:  # noqa: ANN401
+        """Decode the body as JSON."""
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        """Raise for an error status, like requests does."""
+        if self.status_code >= 400:  # noqa: PLR2004
+            msg = f"{self.status_code} error for {self.url}"
+            raise ReplayError(msg)
+
+
+def recording_path(root: Path, url: str, params: dict[str, Any]) -> Path:
+    """Get the file a response is recorded in, which only depends on the URL and the parameters.
+
+    Archive requests ask for days relative to today, so their days are keyed as the number of days from today.
+    That way a recording is replayed on the days after it was made too.
+    """
+    today = datetime.now(UTC).date()
+    relative = {
+        name: (date.fromisoformat(value) - today).days if name in DATE_PARAMS else value
+        for name, value in params.items()
+    }
+    normalized = json.dumps([url, sorted(relative.items())], default=str)
+    return root / f"{hashlib.sha256(normalized.encode()).hexdigest()}.bin"
+
+
+class RecordingSession:
+    """Pass requests on to a real session and record every successful response body."""
+
+    def __init__(self, session: requests.Session, root: Path) -> None:
+        self.session = session
+        self.root = root
+
+    def get(self, url: str, params: dict[str, Any], **kwargs: Any) -> requests.Response:  # noqa: ANN401
+        """Send a request and record its response."""
+        response = self.session.get(url, params=params, **kwargs)
+        if response.ok:
+            path = recording_path(self.root, url, params)
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(response.content)
+            tmp.replace(path)
+            log.debug("Recorded %s to %s", url, path.name)
+        return response
+
+
+class ReplaySession:
+    """Answer requests from recorded responses, with artificial latency and failures.
+
+    Every request waits latency seconds plus a random jitter of up to jitter seconds, and fails with a 500 status at
+    the given failure rate. The random draws are seeded, so a run can be repeated exactly.
+    Requests without a recording get a 404 status.
+    """
+
+    def __init__(self, root: Path, latency: float, jitter: float, failure_rate: float, seed: int) -> None:
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)  # noqa: S311
+        self._lock = threading.Lock()
+
+    def get(self, url: str, params: dict[str, Any], **_: Any) -> ReplayResponse:  # noqa: ANN401
+        """Replay the recorded response of a request."""
+        with self._lock:
+            delay = self.latency + self.jitter * self._random.random()
+            failed = self._random.random() < self.failure_rate
+        time.sleep(delay)
+
+        if failed:
+            return ReplayResponse(url, 500, b"")
+        path = recording_path(self.root, url, params)
+        if not path.exists():
+            log.warning("No recording of %s with %s", url, params)
+            return ReplayResponse(url, 404, b"")
+        return ReplayResponse(url, 200, path.read_bytes())
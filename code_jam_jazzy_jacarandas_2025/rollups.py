@@ -0,0 +1,91 @@
+"""Daily rollups of hourly weather data.
+
+A daily row holds the OHLC temperatures, the precipitation sum, the mean and maximum wind speed and the number of
+hours it was computed from. Rows are computed with one NumPy reduction per value over all days at once, so the archive
+store can recompute just the days new hours arrived for.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Literal, NamedTuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from numpy import ndarray
+
+SECONDS_PER_DAY = 86400
+ROLLUP_COLUMNS = ("open", "high", "low", "close", "precipitation", "wind_mean", "wind_max", "hours")
+OPEN, HIGH, LOW, CLOSE, PRECIPITATION, WIND_MEAN, WIND_MAX, HOURS = range(len(ROLLUP_COLUMNS))
+
+type Period = Literal["week", "month"]
+
+
+class DailyRollups(NamedTuple):
+    """Rollup rows of one location, days are counted in UTC days since the epoch."""
+
+    days: ndarray
+    data: ndarray
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def column(self, name: str) -> ndarray:
+        """Get one rollup value of every row."""
+        return self.data[:, ROLLUP_COLUMNS.index(name)]
+
+
+def period_starts(days: ndarray, period: Period) -> ndarray:
+    """Get the first day of the week starting on Monday or the calendar month every day falls in."""
+    if period == "week":
+        # The epoch started on a Thursday.
+        return (days + 3) // 7 * 7 - 3
+    months = days.astype("datetime64[D]").astype("datetime64[M]")
+    return months.astype("datetime64[D]").astype(np.int64)
+
+
+def rollup_hours(times: ndarray, data: ndarray, columns: Sequence[str]) -> DailyRollups:
+    """Compute the daily rows of sorted hourly data, a row per column of data like ``archive_store.HourlyBlock``.
+
+    Hours without a temperature are left out, days without any get NaN values and zero hours.
+    Values missing from columns, like precipitation in data archived before it was fetched, are NaN.
+    """
+    days = times // SECONDS_PER_DAY
+    if not len(days):
+        return DailyRollups(days, np.empty((0, len(ROLLUP_COLUMNS)), dtype=np.float32))
+
+    starts = run_starts(days)
+    rolled = np.full((len(starts), len(ROLLUP_COLUMNS)), np.nan, dtype=np.float32)
+
+    temperatures = data[columns.index("temperature_2m")]
+    valid = ~np.isnan(temperatures)
+    positions = np.arange(len(days))
+    first = np.minimum.reduceat(np.where(valid, positions, len(days)), starts)
+    last = np.maximum.reduceat(np.where(valid, positions, -1), starts)
+    held = last >= 0
+    rolled[held, OPEN] = temperatures[first[held]]
+    rolled[:, HIGH] = np.fmax.reduceat(temperatures, starts)
+    rolled[:, LOW] = np.fmin.reduceat(temperatures, starts)
+    rolled[held, CLOSE] = temperatures[last[held]]
+    rolled[:, HOURS] = np.add.reduceat(valid.astype(np.int32), starts)
+
+    if "precipitation" in columns:
+        precipitation = data[columns.index("precipitation")]
+        counts = np.add.reduceat((~np.isnan(precipitation)).astype(np.int32), starts)
+        sums = np.add.reduceat(np.nan_to_num(precipitation), starts)
+        rolled[:, PRECIPITATION] = np.where(counts > 0, sums, np.nan)
+    if "wind_speed_10m" in columns:
+        wind = data[columns.index("wind_speed_10m")]
+        counts = np.add.reduceat((~np.isnan(wind)).astype(np.int32), starts)
+        sums = np.add.reduceat(np.nan_to_num(wind), starts)
+        rolled[:, WIND_MEAN] = np.divide(sums, counts, out=np.full(len(starts), np.nan), where=counts > 0)
+        rolled[:, WIND_MAX] = np.fmax.reduceat(wind, starts)
+
+    return DailyRollups(days[starts], rolled)
+
+
+def run_starts(keys: ndarray) -> ndarray:
+    """Get the positions where a run of equal sorted keys starts."""
+    return np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
@@ -1,3 +1,5 @@
+import enum
+
 import reflex as rx
 from confkit import Enum
 from rxconfig import config
@@ -5,6 +7,22 @@ from rxconfig import config
 from code_jam_jazzy_jacarandas_2025.config import Config
 
 
+class CacheBackend(enum.Enum):
+    """Storage backends supported by requests-cache."""
+
+    SQLITE = "sqlite"
+    MEMORY = "memory"
+    FILESYSTEM = "filesystem"
+
+
+class Transport(enum.Enum):
+    """Where weather data requests are sent."""
+
+    LIVE = "live"
+    RECORD = "record"
+    REPLAY = "replay"
+
+
 class Settings:
     """Application settings."""
 
@@ -26,3 +44,29 @@ class FetcherSettings:
     archive_api_url = Config("https://archive-api.open-meteo.com/v1/archive")
     country_name = Config("London")
     country_code = Config("GB")
+    cache_name = Config(".cache")
+    cache_backend = Config(Enum(CacheBackend.SQLITE))
+    cache_expire_after = Config(3600)
+    pool_size = Config(10)
+    archive_store_path = Config(".archive")
+    figure_cache_max_mb = Config(64)
+    figure_cache_ttl = Config(3600)
+    forecast_cache_max_mb = Config(64)
+    forecast_soft_ttl = Config(3600)
+    forecast_hard_ttl = Config(86400)
+    batch_size = Config(20)
+    prefetch_enabled = Config(True)  # noqa: FBT003
+    prefetch_interval = Config(3600)
+    prefetch_offset = Config(300)
+    prefetch_concurrency = Config(4)
+    prefetch_requests_per_minute = Config(60)
+    transport = Config(Enum(Transport.LIVE))
+    recordings_path = Config(".recordings")
+    replay_latency = Config(0.0)
+    replay_jitter = Config(0.0)
+    replay_failure_rate = Config(0.0)
+    replay_seed = Config(0)
+    metrics_sample_rate = Config(0.1)
+    candlestick_daily_days = Config(31)
+    candlestick_weekly_days = Config(182)
+    candlestick_history_days = Config(31)
@@ -3,7 +3,8 @@ from typing import Any, ClassVar
 import reflex as rx
 from reflex.components.radix.themes.components.slider import Slider
 
-from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings, Settings
+from code_jam_jazzy_jacarandas_2025.fetcher import Location
+from code_jam_jazzy_jacarandas_2025.settings import Settings
 from code_jam_jazzy_jacarandas_2025.states import FetcherState
 
 
@@ -71,13 +72,12 @@ class CountrySlider(rx.State):
     country_index: int = 0
 
     @rx.event
-    def set_country(self, value: list[int | float]) -> None:
+    async def set_country(self, value: list[int | float]) -> None:
         """Set the selected country based on slider value."""
         self.country_index = int(value[0])
-        FetcherSettings.country_name = self.countries[self.country_index][0]
-        FetcherSettings.country_code = self.countries[self.country_index][1]
-        FetcherSettings.latitude = self.countries[self.country_index][2]
-        FetcherSettings.longitude = self.countries[self.country_index][3]
+        # The location lives in the session, so other users are not affected.
+        fetcher_state = await self.get_state(FetcherState)
+        fetcher_state.select_location(Location(*self.countries[self.country_index]))
 
     @rx.var
     def selected_country_display(self) -> str:
@@ -1,53 +1,68 @@
 from __future__ import annotations
 
-import contextlib
-import struct
-from datetime import UTC, datetime, timedelta
-from typing import TYPE_CHECKING, TypedDict
-
-import numpy as np
-import openmeteo_requests
-import pandas as pd
-import plotly.graph_objects as go
+import asyncio
+import functools
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Any
+
 import reflex as rx
-import requests_cache
-from openmeteo_sdk.VariableWithValues import VariableWithValues
-from retry_requests import retry
-
-from code_jam_jazzy_jacarandas_2025.charts import (
-    create_candlestick_chart,
-    create_pie_chart,
-    create_rain_radar_chart,
-    create_wind_spiral_chart,
-)
+
+from code_jam_jazzy_jacarandas_2025.fetcher import Location, weather_fetcher
 from code_jam_jazzy_jacarandas_2025.logger import app_log
+from code_jam_jazzy_jacarandas_2025.metrics import metrics
+from code_jam_jazzy_jacarandas_2025.ohlc import DailyOHLC
 from code_jam_jazzy_jacarandas_2025.settings import FetcherSettings
 
 if TYPE_CHECKING:
+    from collections.abc import Awaitable
+    from concurrent.futures import Future
     from logging import Logger
 
-    from numpy import ndarray
-    from openmeteo_sdk.VariablesWithTime import VariablesWithTime
-    from openmeteo_sdk.VariableWithValues import VariableWithValues
-    from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+    import pandas as pd
 
+    from code_jam_jazzy_jacarandas_2025.rollups import DailyRollups
 
-class HourlyData(TypedDict):
-    """TypedDict for hourly weather data dictionary."""
-
-    date: pd.DatetimeIndex
-    temperature_2m: ndarray
-    precipitation: ndarray
-    wind_speed_10m: ndarray
+# Chart names in the order the fetcher builds them.
+CHARTS = ("ohcl_temp", "pie_temp", "rain_radar", "wind_speed")
 
 
 class FetcherState(rx.State):
-    """Store plotly charts once fetched."""
-
-    ohcl_temp_chart: go.Figure = go.Figure()
-    pie_temp_chart: go.Figure = go.Figure()
-    rain_radar_chart: go.Figure = go.Figure()
-    wind_speed_chart: go.Figure = go.Figure()
+    """Store the keys of the plotly charts once fetched.
+
+    Every chart is split into its binary encoded traces and its layout, see ``transport.compact_figure``.
+    The session only holds the keys of its charts in the shared figure cache, the traces and layouts are looked up
+    when they are sent to the client and are never serialized with the session state.
+
+    The client holds the full traces of a base chart, and a patch turning them into the traces of the shown chart.
+    Updates only resend the patch, until it grows about as large as the traces, see ``transport.diff_traces``.
+    """
+
+    _ohcl_temp_key: str = ""
+    _pie_temp_key: str = ""
+    _rain_radar_key: str = ""
+    _wind_speed_key: str = ""
+
+    _ohcl_temp_base_key: str = ""
+    _pie_temp_base_key: str = ""
+    _rain_radar_base_key: str = ""
+    _wind_speed_base_key: str = ""
+
+    # The layout keys only move when the layout changes, so unchanged layouts aren't resent.
+    _ohcl_temp_layout_key: str = ""
+    _pie_temp_layout_key: str = ""
+    _rain_radar_layout_key: str = ""
+    _wind_speed_layout_key: str = ""
+
+    # The candlestick chart starts out with a short tail of history, older days load when it is zoomed out to them.
+    _history_days: int = FetcherSettings.candlestick_history_days
+
+    # The location is kept per session, FetcherSettings only provides the default.
+    _location_name: str = FetcherSettings.country_name
+    _location_code: str = FetcherSettings.country_code
+    _latitude: float = FetcherSettings.latitude
+    _longitude: float = FetcherSettings.longitude
+    # The location of the shown charts, which stay shown while the charts of the same location are refreshed.
+    _shown_location: Location | None = None
 
     loaded: bool = False
 
@@ -57,189 +72,279 @@ class FetcherState(rx.State):
         """Get logger for FetcherState."""
         return app_log.getChild("FetcherState")
 
-    def _get_session(self) -> openmeteo_requests.Client:
-        cache_session = requests_cache.CachedSession(".cache", expire_after=3600)
-        retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-        # retry() returns our cache_session
-        return openmeteo_requests.Client(session=retry_session)  # type: ignore[reportArgumentType]
-
-    def get_hourly_data(
-        self, response: WeatherApiResponse
-    ) -> None | tuple[VariablesWithTime, list[VariableWithValues]]:
-        """Process hourly data. The order of variables needs to be the same as requested."""
-        hourly = response.Hourly()
-        if hourly is None:
-            return None
-
-        variables = self._extract_hourly_variables(hourly)
-
-        return (hourly, variables) if variables else None
-
-    def _extract_hourly_variables(self, hourly: VariablesWithTime) -> list[VariableWithValues]:
-        variables: list[VariableWithValues] = []
-        i = 0
-        while True:
-            try:
-                hourly_var = hourly.Variables(i)
-                if hourly_var is None:
-                    break
-                variables.append(hourly_var)
-                i += 1
-            except (struct.error, TypeError):
-                # API buffer issues or type errors - stop collecting variables
-                break
-        return variables
-
-    def _get_api_params(self) -> dict[str, str | float | int | list[str]]:
-        """Get API parameters for weather data request."""
-        return {
-            "latitude": FetcherSettings.latitude,
-            "longitude": FetcherSettings.longitude,
-            "hourly": FetcherSettings.hourly.split(),
-            "timezone": FetcherSettings.timezone,
-            "forecast_days": FetcherSettings.forecast_days,
-        }
-
-    def _fetch_api_data(self) -> WeatherApiResponse | None:
-        """Fetch raw weather data from Open-meteo API."""
-        openmeteo = self._get_session()
-        params = self._get_api_params()
-
-        return openmeteo.weather_api(FetcherSettings.api_url, params=params)[0]
-
-    def _fetch_api_archive_data(self) -> WeatherApiResponse | None:
-        """Fetch raw weather data from Open-meteo API."""
-        openmeteo = self._get_session()
-        params = self._get_api_params()
-        del params["forecast_days"]
-
-        lookback_days = FetcherSettings.lookback_days
-
-        today = datetime.now(UTC).date()
-        start_date = today - timedelta(days=lookback_days)
-
-        params.update(
-            {
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": today.strftime("%Y-%m-%d"),
-            }
+    @property
+    def location(self) -> Location:
+        """Get the location selected in this session."""
+        return Location(self._location_name, self._location_code, self._latitude, self._longitude)
+
+    @rx.var(deps=["_ohcl_temp_base_key"], auto_deps=False)
+    def ohcl_temp_chart(self) -> dict:
+        """Get the base traces of the candlestick chart."""
+        return _traces(self._ohcl_temp_base_key, self._ohcl_temp_key)
+
+    @rx.var(deps=["_pie_temp_base_key"], auto_deps=False)
+    def pie_temp_chart(self) -> dict:
+        """Get the base traces of the pie chart."""
+        return _traces(self._pie_temp_base_key, self._pie_temp_key)
+
+    @rx.var(deps=["_rain_radar_base_key"], auto_deps=False)
+    def rain_radar_chart(self) -> dict:
+        """Get the base traces of the rain radar chart."""
+        return _traces(self._rain_radar_base_key, self._rain_radar_key)
+
+    @rx.var(deps=["_wind_speed_base_key"], auto_deps=False)
+    def wind_speed_chart(self) -> dict:
+        """Get the base traces of the wind speed chart."""
+        return _traces(self._wind_speed_base_key, self._wind_speed_key)
+
+    @rx.var(deps=["_ohcl_temp_base_key", "_ohcl_temp_key"], auto_deps=False)
+    def ohcl_temp_patch(self) -> list:
+        """Get the patch of the base traces of the candlestick chart."""
+        return _patch(self._ohcl_temp_base_key, self._ohcl_temp_key)
+
+    @rx.var(deps=["_pie_temp_base_key", "_pie_temp_key"], auto_deps=False)
+    def pie_temp_patch(self) -> list:
+        """Get the patch of the base traces of the pie chart."""
+        return _patch(self._pie_temp_base_key, self._pie_temp_key)
+
+    @rx.var(deps=["_rain_radar_base_key", "_rain_radar_key"], auto_deps=False)
+    def rain_radar_patch(self) -> list:
+        """Get the patch of the base traces of the rain radar chart."""
+        return _patch(self._rain_radar_base_key, self._rain_radar_key)
+
+    @rx.var(deps=["_wind_speed_base_key", "_wind_speed_key"], auto_deps=False)
+    def wind_speed_patch(self) -> list:
+        """Get the patch of the base traces of the wind speed chart."""
+        return _patch(self._wind_speed_base_key, self._wind_speed_key)
+
+    @rx.var(deps=["_ohcl_temp_layout_key"], auto_deps=False)
+    def ohcl_temp_layout(self) -> dict:
+        """Get the layout of the candlestick chart."""
+        return _layout(self._ohcl_temp_layout_key)
+
+    @rx.var(deps=["_pie_temp_layout_key"], auto_deps=False)
+    def pie_temp_layout(self) -> dict:
+        """Get the layout of the pie chart."""
+        return _layout(self._pie_temp_layout_key)
+
+    @rx.var(deps=["_rain_radar_layout_key"], auto_deps=False)
+    def rain_radar_layout(self) -> dict:
+        """Get the layout of the rain radar chart."""
+        return _layout(self._rain_radar_layout_key)
+
+    @rx.var(deps=["_wind_speed_layout_key"], auto_deps=False)
+    def wind_speed_layout(self) -> dict:
+        """Get the layout of the wind speed chart."""
+        return _layout(self._wind_speed_layout_key)
+
+    def select_location(self, location: Location) -> None:
+        """Show another location, its candlestick chart starts out with a short tail of history again."""
+        self._location_name, self._location_code, self._latitude, self._longitude = location
+        self._history_days = FetcherSettings.candlestick_history_days
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Leave the looked up charts out of the serialized state, they are looked up again when needed."""
+        # Reflex caches computed vars on the instance under a __cached_ prefix, the chart vars are the only ones here.
+        return {name: value for name, value in super().__getstate__().items() if not name.startswith("__cached_")}
+
+    def _show_chart(self, name: str, key: str) -> None:
+        """Point a chart at new traces, and at a new layout only when it changed, to keep state deltas small.
+
+        The new traces are sent as a patch of the base traces when that is much smaller, else they become the base.
+        """
+        if getattr(self, f"_{name}_key") == key:
+            if not self._chart_found(name):
+                # Assigning the keys again marks the chart vars dirty, so they are looked up and sent again.
+                for suffix in ("key", "base_key", "layout_key"):
+                    setattr(self, f"_{name}_{suffix}", getattr(self, f"_{name}_{suffix}"))
+            return
+        setattr(self, f"_{name}_key", key)
+        if weather_fetcher.chart_patch(getattr(self, f"_{name}_base_key"), key) is None:
+            setattr(self, f"_{name}_base_key", key)
+        payload = weather_fetcher.chart_payload(key)
+        shown = weather_fetcher.chart_payload(getattr(self, f"_{name}_layout_key"))
+        if payload is None or shown is None or shown["layout"] != payload["layout"]:
+            setattr(self, f"_{name}_layout_key", key)
+
+    def _chart_found(self, name: str) -> bool:
+        """Check the traces and layout of a chart were in the figure cache when they were last sent.
+
+        They were not when the chart was evicted from it, nothing is known about it after a restart.
+        """
+        return all(
+            getattr(self, self.computed_vars[var]._cache_attr, None)  # noqa: SLF001
+            for var in (f"{name}_chart", f"{name}_layout")
         )
 
-        return openmeteo.weather_api(FetcherSettings.archive_api_url, params=params)[0]
-
-    def _process_hourly_data(self, response: WeatherApiResponse) -> pd.DataFrame | None:
-        """Process hourly weather data into a DataFrame."""
-        if data := self.get_hourly_data(response):
-            hourly, hourly_variables = data
-        else:
+    async def _await_result[T](self, task: Awaitable[T | None]) -> T | None:
+        """Await a fetch task, logging and swallowing any error so the other request can still be used."""
+        try:
+            return await task
+        except Exception:
+            self.log.exception("Weather API request failed")
             return None
 
-        date_range = pd.date_range(
-            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-            freq=pd.Timedelta(seconds=hourly.Interval()),
-            inclusive="left",
-        )
+    @rx.event(background=True)
+    async def fetch_weather_data(self) -> None:
+        """Fetch data about temperatures from the Open-meteo free API.
 
-        if len(hourly_variables) < 1:
-            return None
+        Data seen before is shown right away, even when stale. Stale data is refreshed in the background,
+        and the charts are pushed again once the refresh lands.
+        """
+        with metrics.span("fetch_weather_data"):
+            await self._fetch_weather_data()
+
+    async def _fetch_weather_data(self) -> None:
+        async with self:
+            location = self.location
+            if self._shown_location != location:
+                self.loaded = False
+            days = self._history_days
 
-        # Based on FetcherSettings.hourly:
-        # "temperature_2m,precipitation,rain,showers,wind_speed_10m,wind_direction_10m,wind_gusts_10m"
-        # Variables order: 0=temperature_2m, 1=precipitation, 2=rain, 3=showers,
-        # 4=wind_speed_10m, 5=wind_direction_10m, 6=wind_gusts_10m
-        hourly_data: dict[str, pd.DatetimeIndex | np.ndarray] = {
-            "date": date_range,
-            "temperature_2m": hourly_variables[0].ValuesAsNumpy(),
-        }
+        forecast_refresh = weather_fetcher.revalidate_forecast(location)
+        archive_refresh = await asyncio.to_thread(weather_fetcher.revalidate_archive, location)
 
-        self._add_precipitation_data(hourly_variables, date_range, hourly_data)
-        self._add_wind_data(hourly_variables, hourly_data)
+        await self._show_weather_data(location, days, self._get_forecast(location), self._get_archive(location, days))
+        if forecast_refresh is None and archive_refresh is None:
+            return
 
-        hourly_dataframe = pd.DataFrame(data=hourly_data)
-        hourly_dataframe["date"] = pd.to_datetime(hourly_dataframe["date"])
+        await self._show_weather_data(
+            location,
+            days,
+            asyncio.wrap_future(forecast_refresh) if forecast_refresh else self._get_forecast(location),
+            self._get_archive(location, days, after=archive_refresh),
+        )
 
-        return hourly_dataframe
+    @rx.event(background=True)
+    async def load_candlestick_range(self, start: str | None) -> None:
+        """Load the older history the candlestick chart was zoomed or panned out to from the archive store.
+
+        The chart only holds the days it was sent, so its range selector and slider can't reach older days on their
+        own. An empty start loads the whole lookback window.
+        """
+        days = _history_days_from(start)
+        async with self:
+            if days is None or days <= self._history_days:
+                return
+            self._history_days = days
+            location = self.location
+
+        with metrics.span("candlestick_range"):
+            forecast, history = await asyncio.gather(
+                self._await_result(self._get_forecast(location)),
+                self._await_result(self._get_archive(location, days)),
+            )
+            if history is None:
+                return
+            ohlc = await asyncio.to_thread(DailyOHLC, forecast)
+            await asyncio.to_thread(ohlc.prepend_rollups, history)
+            candlestick_key = await asyncio.to_thread(weather_fetcher.build_candlestick_chart, location, ohlc)
+
+        async with self:
+            if self.location == location and self._history_days == days:
+                self._show_chart("ohcl_temp", candlestick_key)
+
+    @staticmethod
+    def _get_forecast(location: Location) -> Awaitable[pd.DataFrame | None]:
+        return asyncio.to_thread(weather_fetcher.fetch_forecast, location)
+
+    @staticmethod
+    async def _get_archive(
+        location: Location, days: int, *, after: Future[DailyRollups | None] | None = None
+    ) -> DailyRollups | None:
+        """Read the newest days of the held archive, after the given refresh of it landed."""
+        if after is not None:
+            await asyncio.wrap_future(after)
+        return await asyncio.to_thread(
+            functools.partial(weather_fetcher.load_history, location, stale_ok=True, days=days)
+        )
 
-    def _add_precipitation_data(
+    async def _show_weather_data(
         self,
-        hourly_variables: list[VariableWithValues],
-        date_range: pd.DatetimeIndex,
-        hourly_data: dict[str, pd.DatetimeIndex | np.ndarray],
+        location: Location,
+        days: int,
+        forecast: Awaitable[pd.DataFrame | None],
+        archive: Awaitable[DailyRollups | None],
     ) -> None:
-        """Add precipitation data from API variables (precipitation, rain, showers)."""
-        total_precipitation = np.zeros(len(date_range))
+        """Push the charts of a location, unless the session moved on to another location in the meantime.
+
+        The forecast and archive requests run concurrently. Forecast charts are pushed as soon as the
+        forecast arrives, the candlestick chart is updated with the given days of archive rollups once those arrive.
+        It is left alone when the session loaded more history in the meantime.
+        """
+        forecast_task = asyncio.ensure_future(forecast)
+        archive_task = asyncio.ensure_future(archive)
+
+        hourly_dataframe = await self._await_result(forecast_task)
+        # The daily values of the forecast are reused for the full candlestick chart, the rollups are prepended.
+        ohlc = DailyOHLC()
+        if hourly_dataframe is not None:
+            with metrics.span("ohlc"):
+                ohlc = await asyncio.to_thread(DailyOHLC, hourly_dataframe)
+            with metrics.span("forecast_charts"):
+                charts = await asyncio.to_thread(
+                    weather_fetcher.build_forecast_charts, location, hourly_dataframe, ohlc
+                )
+            # Leaving the block computes the state delta and sends it, which is where the state is serialized.
+            with metrics.span("state_update", charts="forecast"):
+                async with self:
+                    if self.location != location:
+                        return
+                    for name, key in zip(CHARTS, charts, strict=True):
+                        self._show_chart(name, key)
+                    self._shown_location = location
+                    self.loaded = True
+
+        history = await self._await_result(archive_task)
+        if history is None:
+            return
 
-        # Add precipitation (index 1)
-        # Add rain (index 2)
-        # Add showers (index 3)
-        for i in range(1, 4):
-            if len(hourly_variables) > i:
-                with contextlib.suppress(struct.error, TypeError):
-                    total_precipitation += hourly_variables[i].ValuesAsNumpy()
+        with metrics.span("ohlc_prepend"):
+            await asyncio.to_thread(ohlc.prepend_rollups, history)
+        with metrics.span("candlestick_chart"):
+            candlestick_key = await asyncio.to_thread(weather_fetcher.build_candlestick_chart, location, ohlc)
 
-        hourly_data["precipitation"] = total_precipitation
+        with metrics.span("state_update", charts="candlestick"):
+            async with self:
+                if self.location != location or self._history_days != days:
+                    return
+                self._show_chart("ohcl_temp", candlestick_key)
+                self._shown_location = location
+                self.loaded = True
 
-    def _add_wind_data(
-        self,
-        hourly_variables: list[VariableWithValues],
-        hourly_data: dict[str, pd.DatetimeIndex | np.ndarray],
-    ) -> None:
-        """Add wind speed data from API variables."""
-        # Add wind_speed_10m (index 4)
-        # Add wind_direction_10m (index 5)
-        # Add wind_gusts_10m (index 6)
-        for i in range(4, 7):
-            if len(hourly_variables) > i:
-                with contextlib.suppress(struct.error, TypeError):
-                    data_key = f"wind_{['speed', 'direction', 'gusts'][i - 4]}_10m"
-                    data = hourly_variables[i].ValuesAsNumpy()
-                    hourly_data[data_key] = data
-
-    def _create_ohlc_dataframe(self, hourly_dataframe: pd.DataFrame) -> pd.DataFrame:
-        """Convert hourly data to OHLC (Open, High, Low, Close) format."""
-        df_ohlc = (
-            hourly_dataframe.set_index("date")["temperature_2m"]
-            .resample("D")
-            .agg(["first", "max", "min", "last"])
-            .dropna()
-        )
 
-        return (
-            df_ohlc.rename(columns={"first": "Open", "max": "High", "min": "Low", "last": "Close"})  # type: ignore[reportCallIssue]
-            .reset_index()
-            .round(2)
-        )
+def _history_days_from(start: str | None) -> int | None:
+    """Get the days of history a candlestick range from start needs, None when start is not a date.
 
-    @rx.event
-    def fetch_weather_data(self) -> None:
-        """Fetch data about temperatures from the Open-meteo free API."""
-        self.loaded = False
+    Some days before start are included, so panning a bit further doesn't load again.
+    """
+    if start is None:
+        return None
+    if not start:
+        return FetcherSettings.lookback_days
+    try:
+        first = datetime.fromisoformat(start).date()
+    except ValueError:
+        return None
+    days = (datetime.now(UTC).date() - first).days + FetcherSettings.candlestick_history_days
+    return min(days, FetcherSettings.lookback_days)
 
-        # Fetch raw data from API
-        response = self._fetch_api_data()
-        if not response:
-            return
 
-        archive_resp = self._fetch_api_archive_data()
+def _traces(base_key: str, key: str) -> dict:
+    """Get the base traces of a chart from the shared figure cache.
 
-        # Process hourly data
-        hourly_dataframe = self._process_hourly_data(response)
-        full_df_ohlc = hourly_dataframe
-        archive_hourly_dataframe = self._process_hourly_data(archive_resp)
-        if hourly_dataframe is None:
-            return
-        if archive_hourly_dataframe is not None:
-            full_hourly_dataframe = pd.concat([archive_hourly_dataframe, hourly_dataframe])
-            full_hourly_dataframe = full_hourly_dataframe.sort_index()
-            full_df_ohlc = self._create_ohlc_dataframe(full_hourly_dataframe)
-        # Create OHLC dataframe
-        df_ohlc = self._create_ohlc_dataframe(hourly_dataframe)
-
-        # Create charts
-        self.ohcl_temp_chart = create_candlestick_chart(full_df_ohlc)
-        self.pie_temp_chart = create_pie_chart(df_ohlc)
-        self.rain_radar_chart = create_rain_radar_chart(hourly_dataframe)
-        self.wind_speed_chart = create_wind_spiral_chart(hourly_dataframe)
-
-        self.loaded = True
+    The shown traces are sent in full when the base was dropped from it, charts that were dropped too show empty.
+    """
+    payload = weather_fetcher.chart_payload(base_key) or weather_fetcher.chart_payload(key)
+    return {"data": payload["data"]} if payload is not None else {}
+
+
+def _patch(base_key: str, key: str) -> list:
+    """Get the patch turning the base traces of a chart into the shown ones, empty when they are shown in full."""
+    return weather_fetcher.chart_patch(base_key, key) or []
+
+
+def _layout(key: str) -> dict:
+    """Get the layout of a chart from the shared figure cache."""
+    payload = weather_fetcher.chart_payload(key)
+    return payload["layout"] if payload is not None else {}
@@ -0,0 +1,158 @@
+"""Compact chart transport.
+
+Figures are sent to the client as traces with numeric arrays encoded as base64 typed arrays (Plotly's ``bdata``),
+and a separate layout without the template. The template is a prop of ``rx.plotly`` and part of the compiled page,
+the layout only has to be resent when it changes.
+Traces the client already holds can be updated with a patch of the points that changed, see ``diff_traces``.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from typing import TYPE_CHECKING, Any, TypedDict
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+if TYPE_CHECKING:
+    from plotly.graph_objects import Figure
+
+# Plotly.js typed array names, see https://plotly.com/javascript/reference/#typed-arrays
+_TYPED_ARRAY_DTYPES = {
+    np.dtype(np.float64): "f8",
+    np.dtype(np.float32): "f4",
+    np.dtype(np.int32): "i4",
+    np.dtype(np.int16): "i2",
+    np.dtype(np.uint8): "u1",
+}
+
+
+class ChartPayload(TypedDict):
+    """A figure split into its traces and its layout."""
+
+    data: list[dict[str, Any]]
+    layout: dict[str, Any]
+
+
+class ArrayPatch(TypedDict):
+    """The first keep values of an array are kept, the values of tail replace the rest."""
+
+    keep: int
+    tail: dict[str, str] | list[Any]
+
+
+# Patches of the arrays of every trace, keyed by their dotted path in the trace.
+type TracePatch = list[dict[str, ArrayPatch]]
+
+
+def _b64(values: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(values).tobytes()).decode("ascii")
+
+
+def _encode_array(values: np.ndarray) -> dict[str, str] | list[Any]:
+    """Encode a numeric array as a base64 typed array, other arrays are left as lists."""
+    if np.issubdtype(values.dtype, np.datetime64):
+        # Date axes accept milliseconds since the epoch.
+        values = values.astype("datetime64[ms]").astype(np.float64)
+    elif np.issubdtype(values.dtype, np.floating):
+        values = values.astype(np.float32)
+    elif np.issubdtype(values.dtype, np.integer):
+        values = values.astype(np.int32)
+    else:
+        return values.tolist()
+
+    return {
+        "dtype": _TYPED_ARRAY_DTYPES[values.dtype],
+        "bdata": _b64(values),
+    }
+
+
+def _is_number(value: object) -> bool:
+    return isinstance(value, int | float) and not isinstance(value, bool)
+
+
+def _encode_arrays(value: Any) -> Any:  # noqa: ANN401
+    """Encode every numeric array nested in a trace."""
+    if isinstance(value, dict):
+        return {key: _encode_arrays(item) for key, item in value.items()}
+    if isinstance(value, np.ndarray):
+        return _encode_array(value)
+    if isinstance(value, list | tuple) and value and all(_is_number(item) for item in value):
+        return _encode_array(np.asarray(value))
+    return value
+
+
+def compact_figure(figure: Figure) -> ChartPayload:
+    """Split a figure into binary encoded traces and a layout without template."""
+    figure_dict = figure.to_plotly_json()
+    layout = dict(figure_dict["layout"])
+    layout.pop("template", None)
+
+    return {
+        "data": json.loads(to_json_plotly([_encode_arrays(trace) for trace in figure_dict["data"]])),
+        "layout": json.loads(to_json_plotly(layout)),
+    }
+
+
+def diff_traces(base: list[dict[str, Any]], traces: list[dict[str, Any]]) -> TracePatch | None:
+    """Get the patch turning the base traces into the given ones, like Plotly's extendTraces after a truncation.
+
+    Every array keeps the values it has in common with the base from its start, the values after them are replaced.
+    Get None when the traces differ in anything but the values of their arrays.
+    """
+    if len(base) != len(traces):
+        return None
+
+    patch: TracePatch = []
+    for old, new in zip(base, traces, strict=True):
+        arrays: dict[str, ArrayPatch] = {}
+        if not _diff_value(old, new, "", arrays):
+            return None
+        patch.append(arrays)
+    return patch
+
+
+def _diff_value(old: Any, new: Any, path: str, arrays: dict[str, ArrayPatch]) -> bool:  # noqa: ANN401
+    """Add the patches of the arrays in new to arrays, get whether everything else is equal to old."""
+    if _is_typed_array(new):
+        if not _is_typed_array(old) or old["dtype"] != new["dtype"]:
+            return False
+        # Compared as unsigned integers of the same size, so NaNs are equal to each other.
+        unsigned = np.dtype(f"u{np.dtype(new['dtype']).itemsize}")
+        old_values = np.frombuffer(base64.b64decode(old["bdata"]), dtype=unsigned)
+        new_values = np.frombuffer(base64.b64decode(new["bdata"]), dtype=unsigned)
+        keep = _common_prefix(old_values, new_values)
+        if keep < max(len(old_values), len(new_values)):
+            tail = new_values[keep:].view(np.dtype(new["dtype"]))
+            arrays[path] = {"keep": keep, "tail": {"dtype": new["dtype"], "bdata": _b64(tail)}}
+        return True
+    if isinstance(new, dict):
+        return (
+            isinstance(old, dict)
+            and old.keys() == new.keys()
+            and all(_diff_value(old[key], new[key], f"{path}.{key}" if path else key, arrays) for key in new)
+        )
+    if isinstance(new, list) and isinstance(old, list):
+        keep = next(
+            (index for index, (a, b) in enumerate(zip(old, new, strict=False)) if a != b), min(len(old), len(new))
+        )
+        if keep < max(len(old), len(new)):
+            arrays[path] = {"keep": keep, "tail": new[keep:]}
+        return True
+    return old == new
+
+
+def _is_typed_array(value: object) -> bool:
+    return isinstance(value, dict) and value.keys() == {"dtype", "bdata"}
+
+
+def _common_prefix(old: np.ndarray, new: np.ndarray) -> int:
+    length = min(len(old), len(new))
+    differing = np.flatnonzero(old[:length] != new[:length])
+    return int(differing[0]) if len(differing) else length
+
+
+def payload_size(payload: ChartPayload | TracePatch) -> int:
+    """Get the size of a chart payload or trace patch once serialized."""
+    return len(json.dumps(payload, separators=(",", ":")))
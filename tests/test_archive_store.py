@@ -0,0 +1,170 @@
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from code_jam_jazzy_jacarandas_2025.archive_store import ROLLUP_SUFFIX, ArchiveStore
+from code_jam_jazzy_jacarandas_2025.rollups import DailyRollups, rollup_hours
+
+LATITUDE = 51.5085
+LONGITUDE = -0.1257
+
+
+def _hourly(first_day: date, days: int, seed: int = 0) -> pd.DataFrame:
+    """Create hourly data of the archived columns, from midnight of the first day."""
+    rng = np.random.default_rng(seed)
+    hours = days * 24
+    return pd.DataFrame(
+        {
+            "date": pd.date_range(pd.Timestamp(first_day, tz="UTC"), periods=hours, freq="h"),
+            "temperature_2m": rng.uniform(-10, 30, hours).astype(np.float32),
+            "precipitation": rng.exponential(0.3, hours).astype(np.float32),
+            "wind_speed_10m": rng.uniform(0, 40, hours).astype(np.float32),
+        }
+    )
+
+
+def _seconds(dataframe: pd.DataFrame) -> np.ndarray:
+    return dataframe["date"].dt.as_unit("s").astype("int64").to_numpy()
+
+
+def _rollups(hourly: pd.DataFrame) -> DailyRollups:
+    """Compute the rollups of hourly data directly, without the store."""
+    columns = [column for column in hourly.columns if column != "date"]
+    return rollup_hours(_seconds(hourly), hourly[columns].to_numpy(np.float32).T, columns)
+
+
+def _assert_rollups_equal(actual: DailyRollups | None, expected: DailyRollups) -> None:
+    assert actual is not None
+    np.testing.assert_array_equal(actual.days, expected.days)
+    np.testing.assert_allclose(actual.data, expected.data, rtol=1e-6)
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> ArchiveStore:
+    """Get an empty archive store."""
+    return ArchiveStore(tmp_path)
+
+
+def test_write_read_round_trip(store: ArchiveStore) -> None:
+    """Written hours are read back as they were written, the newest day isn't held yet."""
+    hourly = _hourly(date(2025, 1, 1), 5)
+    store.write(LATITUDE, LONGITUDE, hourly)
+
+    block = store.read_block(LATITUDE, LONGITUDE)
+    assert block is not None
+    assert block.columns == ("temperature_2m", "precipitation", "wind_speed_10m")
+    np.testing.assert_array_equal(block.times, _seconds(hourly))
+    for column, values in zip(block.columns, block.data, strict=True):
+        np.testing.assert_array_equal(values, hourly[column].to_numpy())
+    assert block.version == (date(2025, 1, 1), date(2025, 1, 4))
+    assert store.held_range(LATITUDE, LONGITUDE) == block.version
+
+
+def test_write_prepended_range(store: ArchiveStore) -> None:
+    """Older hours are merged in front of the held ones, and the held range grows to cover both."""
+    older = _hourly(date(2025, 1, 1), 5, seed=1)
+    newer = _hourly(date(2025, 1, 6), 5, seed=2)
+    store.write(LATITUDE, LONGITUDE, newer)
+    store.write(LATITUDE, LONGITUDE, older)
+
+    block = store.read_block(LATITUDE, LONGITUDE)
+    assert block is not None
+    hourly = pd.concat([older, newer], ignore_index=True)
+    np.testing.assert_array_equal(block.times, _seconds(hourly))
+    for column, values in zip(block.columns, block.data, strict=True):
+        np.testing.assert_array_equal(values, hourly[column].to_numpy())
+    assert block.version == (date(2025, 1, 1), date(2025, 1, 9))
+
+
+def test_write_leaves_gaps_empty(store: ArchiveStore) -> None:
+    """Hours between two written ranges and hours without a temperature are NaN."""
+    first = _hourly(date(2025, 1, 1), 2)
+    later = _hourly(date(2025, 1, 4), 2)
+    later.loc[later.index[-3:], "temperature_2m"] = np.nan
+    store.write(LATITUDE, LONGITUDE, first)
+    store.write(LATITUDE, LONGITUDE, later)
+
+    block = store.read_block(LATITUDE, LONGITUDE)
+    assert block is not None
+    assert len(block.times) == 5 * 24 - 3
+    assert np.isnan(block.data[:, 2 * 24 : 3 * 24]).all()
+    np.testing.assert_array_equal(block.data[0, 3 * 24 :], later["temperature_2m"].to_numpy()[:-3])
+
+
+def test_read_missing_location(store: ArchiveStore) -> None:
+    """Nothing is held for a location that was never written."""
+    assert store.read_block(LATITUDE, LONGITUDE) is None
+    assert store.held_range(LATITUDE, LONGITUDE) is None
+
+
+def test_missing_ranges(store: ArchiveStore) -> None:
+    """Only the days before and after the held range are missing."""
+    start = date(2025, 1, 1)
+    end = date(2025, 1, 31)
+    assert store.missing_ranges(LATITUDE, LONGITUDE, start, end) == [(start, end)]
+
+    store.write(LATITUDE, LONGITUDE, _hourly(date(2025, 1, 10), 11))
+
+    assert store.missing_ranges(LATITUDE, LONGITUDE, start, end) == [
+        (start, date(2025, 1, 9)),
+        (date(2025, 1, 20), end),
+    ]
+    assert store.missing_ranges(LATITUDE, LONGITUDE, date(2025, 1, 10), date(2025, 1, 19)) == []
+    assert store.missing_ranges(LATITUDE, LONGITUDE, date(2025, 1, 15), end) == [(date(2025, 1, 20), end)]
+    # Ranges that don't overlap the held days are missing as a whole.
+    assert store.missing_ranges(LATITUDE, LONGITUDE, date(2025, 2, 1), date(2025, 2, 5)) == [
+        (date(2025, 2, 1), date(2025, 2, 5))
+    ]
+
+
+def test_rollups_round_trip(store: ArchiveStore) -> None:
+    """The rollups read back are the ones computed from the written hours, limited to the requested days."""
+    hourly = _hourly(date(2025, 1, 1), 5)
+    store.write(LATITUDE, LONGITUDE, hourly)
+
+    expected = _rollups(hourly)
+    _assert_rollups_equal(store.read_rollups(LATITUDE, LONGITUDE, date(2024, 12, 1), date(2025, 2, 1)), expected)
+    _assert_rollups_equal(
+        store.read_rollups(LATITUDE, LONGITUDE, date(2025, 1, 2), date(2025, 1, 3)),
+        DailyRollups(expected.days[1:3], expected.data[1:3]),
+    )
+
+
+def test_rollups_of_prepended_range(store: ArchiveStore) -> None:
+    """Writing an older range adds its rollups in front of the held ones."""
+    older = _hourly(date(2025, 1, 1), 5, seed=1)
+    newer = _hourly(date(2025, 1, 6), 5, seed=2)
+    store.write(LATITUDE, LONGITUDE, newer)
+    store.write(LATITUDE, LONGITUDE, older)
+
+    _assert_rollups_equal(
+        store.read_rollups(LATITUDE, LONGITUDE, date(2025, 1, 1), date(2025, 1, 10)),
+        _rollups(pd.concat([older, newer], ignore_index=True)),
+    )
+
+
+def test_rollups_leave_out_days_without_hours(store: ArchiveStore) -> None:
+    """Days between two written ranges have no rollups."""
+    first = _hourly(date(2025, 1, 1), 2)
+    later = _hourly(date(2025, 1, 4), 2)
+    store.write(LATITUDE, LONGITUDE, first)
+    store.write(LATITUDE, LONGITUDE, later)
+
+    _assert_rollups_equal(
+        store.read_rollups(LATITUDE, LONGITUDE, date(2025, 1, 1), date(2025, 1, 5)),
+        _rollups(pd.concat([first, later], ignore_index=True)),
+    )
+
+
+def test_rollups_rebuilt_from_hourly_file(store: ArchiveStore, tmp_path: Path) -> None:
+    """Rollups are computed from the hourly file when their own file is missing."""
+    hourly = _hourly(date(2025, 1, 1), 5)
+    store.write(LATITUDE, LONGITUDE, hourly)
+    for path in tmp_path.glob(f"*{ROLLUP_SUFFIX}"):
+        path.unlink()
+
+    _assert_rollups_equal(
+        store.read_rollups(LATITUDE, LONGITUDE, date(2025, 1, 1), date(2025, 1, 5)), _rollups(hourly)
+    )
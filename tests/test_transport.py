@@ -0,0 +1,118 @@
+import base64
+import copy
+import functools
+import operator
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+from code_jam_jazzy_jacarandas_2025.transport import TracePatch, compact_figure, diff_traces
+from plotly.graph_objects import Candlestick, Figure, Scatter
+
+
+def _traces(days: int, seed: int = 0, name: str = "temperature") -> list[dict[str, Any]]:
+    """Get the compact traces of a chart with a line and a candlestick trace over the given days."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D", tz="UTC")
+    values = rng.uniform(-10, 30, (4, days))
+    figure = Figure(
+        [
+            Scatter(x=dates, y=values[0], text=[f"day {day}" for day in range(days)], name=name),
+            Candlestick(x=dates, open=values[0], high=values[1], low=values[2], close=values[3]),
+        ]
+    )
+    return compact_figure(figure)["data"]
+
+
+def _decode(value: Any) -> Any:  # noqa: ANN401
+    """Decode the typed arrays nested in a trace."""
+    if isinstance(value, dict) and value.keys() == {"dtype", "bdata"}:
+        return np.frombuffer(base64.b64decode(value["bdata"]), dtype=value["dtype"])
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def _encode_like(array: dict[str, str], values: np.ndarray) -> dict[str, str]:
+    """Encode values as a typed array of the same type as the given one."""
+    return {
+        "dtype": array["dtype"],
+        "bdata": base64.b64encode(values.astype(array["dtype"]).tobytes()).decode("ascii"),
+    }
+
+
+def _apply_patch(traces: list[dict[str, Any]], patch: TracePatch) -> list[dict[str, Any]]:
+    """Apply a patch like ``applyTracePatch`` does on the client."""
+    patched = copy.deepcopy(traces)
+    for trace, arrays in zip(patched, patch, strict=True):
+        for path, array_patch in arrays.items():
+            *parents, last = path.split(".")
+            parent = functools.reduce(operator.getitem, parents, trace)
+            head = _decode(parent[last])[: array_patch["keep"]]
+            tail = _decode(array_patch["tail"])
+            parent[last] = np.concatenate([head, tail]) if isinstance(head, np.ndarray) else [*head, *tail]
+    return patched
+
+
+def _assert_patches(base: list[dict[str, Any]], traces: list[dict[str, Any]]) -> TracePatch:
+    patch = diff_traces(base, traces)
+    assert patch is not None
+    np.testing.assert_equal(_decode(_apply_patch(base, patch)), _decode(traces))
+    return patch
+
+
+def test_identical_traces() -> None:
+    """Identical traces need no patch of any array."""
+    assert _assert_patches(_traces(30), _traces(30)) == [{}, {}]
+
+
+def test_appended_days() -> None:
+    """Appended days only send the new values, the values in common are kept."""
+    base = _traces(30)
+    traces = _traces(35)
+    patch = _assert_patches(base, traces)
+    assert patch[0]["x"]["keep"] == 30
+    assert patch[0]["text"] == {"keep": 30, "tail": [f"day {day}" for day in range(30, 35)]}
+
+
+def test_changed_values() -> None:
+    """Values that changed are sent from the first change onward."""
+    base = _traces(30, seed=1)
+    traces = copy.deepcopy(base)
+    close = _decode(traces[1]["close"]).copy()
+    close[20:] += 1
+    traces[1]["close"] = _encode_like(traces[1]["close"], close)
+
+    patch = _assert_patches(base, traces)
+    assert patch[0] == {}
+    assert patch[1].keys() == {"close"}
+    assert patch[1]["close"]["keep"] == 20
+
+
+def test_truncated_days() -> None:
+    """Arrays that got shorter keep their first values without a tail."""
+    _assert_patches(_traces(35), _traces(30))
+
+
+def test_nan_values_are_equal() -> None:
+    """NaNs at the same place are not counted as a change."""
+    base = _traces(10)
+    values = _decode(base[0]["y"]).copy()
+    values[3] = np.nan
+    base[0]["y"] = _encode_like(base[0]["y"], values)
+    assert diff_traces(base, copy.deepcopy(base)) == [{}, {}]
+
+
+@pytest.mark.parametrize(
+    "traces",
+    [
+        pytest.param(_traces(30)[:1], id="fewer traces"),
+        pytest.param(_traces(30, name="wind"), id="changed name"),
+    ],
+)
+def test_traces_that_cant_be_patched(traces: list[dict[str, Any]]) -> None:
+    """Traces that differ in anything but their arrays get no patch."""
+    assert diff_traces(_traces(30), traces) is None